@@ -0,0 +1,186 @@
+import asyncio
+
+from ServerWorker import ServerWorker, RECV_SIZE, LEGACY_WAIT
+from RtspParser import RtspParser, RtspError
+from FrameScheduler import MAX_LAG
+from Metrics import metrics
+
+# Hàng đợi kết nối TCP đang chờ accept
+LISTEN_BACKLOG = 1024
+
+
+class TransportSender:
+	"""RtpSender counterpart for an asyncio datagram transport."""
+
+	def __init__(self, transport):
+		self.transport = transport
+
+	def sendFrame(self, packets):
+		"""Send a sequence of (header, payload) pairs in order."""
+		sendto = self.transport.sendto
+		for header, payload in packets:
+			sendto(b''.join((header, payload)))
+
+
+class RtcpProtocol(asyncio.DatagramProtocol):
+	"""Hands receiver reports to the session."""
+
+	def __init__(self, stats):
+		self.stats = stats
+
+	def datagram_received(self, data, addr):
+		self.stats.onRtcp(data)
+
+	def error_received(self, exc):
+		pass
+
+
+class AsyncServerWorker(ServerWorker):
+	"""ServerWorker driven by asyncio: RTSP on a stream, RTP on a datagram transport."""
+
+	def __init__(self, reader, writer):
+		clientInfo = {}
+		clientInfo['rtspSocket'] = (writer, writer.get_extra_info('peername'))
+		super().__init__(clientInfo)
+		self.reader = reader
+		self.writer = writer
+		self.loop = asyncio.get_running_loop()
+
+	async def run(self):
+		"""Receive RTSP requests until the client disconnects."""
+		parser = RtspParser()
+		try:
+			while True:
+				try:
+					if parser.pending():
+						data = await asyncio.wait_for(self.reader.read(RECV_SIZE), LEGACY_WAIT)
+					else:
+						data = await self.reader.read(RECV_SIZE)
+				except asyncio.TimeoutError:
+					# Client cũ: request không có dòng trống kết thúc
+					data = None
+				except ConnectionError:
+					data = b''
+				if data == b'':
+					break
+				try:
+					if data is None:
+						requests = [parser.flush()]
+					else:
+						if self.verbose:
+							print("Data received:\n" + data.decode("utf-8", "replace"))
+						requests = parser.feed(data)
+				except RtspError as e:
+					metrics.count('server.errors')
+					print("RTSP error: %s" % e)
+					break
+				for request in requests:
+					started = metrics.start()
+					self.processRtspRequest(request)
+					metrics.stop('server.rtsp', started)
+				await self.writer.drain()
+		finally:
+			self.closeSession()
+			self.writer.close()
+
+	def startRtp(self):
+		"""Open the RTP transport, then pace the session with loop timers."""
+		if self.clientInfo.get('multicast'):
+			self.clientInfo['channel'].joinMulticast(self)
+			return
+		self.clientInfo['task'] = asyncio.get_running_loop().create_task(self.openRtp())
+
+	async def openRtp(self):
+		loop = asyncio.get_running_loop()
+		address = self.clientInfo['rtspSocket'][1][0]
+		port = self.clientInfo['rtpPort']
+		stats = self.clientInfo['stats']
+		transport, _ = await loop.create_datagram_endpoint(
+			asyncio.DatagramProtocol, remote_addr=(address, port))
+		self.clientInfo['transport'] = transport
+		self.clientInfo['sender'] = TransportSender(transport)
+		rtcpTransport, _ = await loop.create_datagram_endpoint(
+			lambda: RtcpProtocol(stats), remote_addr=(address, port + 1))
+		self.clientInfo['rtcpTransport'] = rtcpTransport
+		channel = self.clientInfo.get('channel')
+		if channel is not None and self.clientInfo.get('cursor') is None:
+			channel.subscribe(self)
+		else:
+			self.onTimer(loop.time())
+
+	def onTimer(self, deadline):
+		"""Run one pacing tick and arm the timer for the next deadline."""
+		# Vòng lặp asyncio đã là một heap hạn chót dùng chung cho mọi session
+		if metrics.enabled:
+			metrics.observe('server.lateness', self.loop.time() - deadline)
+		nextDeadline = self.tick(deadline)
+		if nextDeadline is None:
+			# Kênh: phát lại đã bắt kịp trực tiếp, giữ transport để nhận từ kênh
+			if 'channel' not in self.clientInfo:
+				self.stopRtp()
+			return
+		loop = asyncio.get_running_loop()
+		# Trễ quá nhiều thì đặt lại mốc thay vì gửi dồn
+		if nextDeadline < loop.time() - MAX_LAG:
+			nextDeadline = loop.time()
+		self.clientInfo['timer'] = loop.call_at(nextDeadline, self.onTimer, nextDeadline)
+
+	def stopRtp(self):
+		"""Cancel the RTP timer and close the transport (PAUSE or TEARDOWN)."""
+		channel = self.clientInfo.get('channel')
+		if channel is not None:
+			channel.unsubscribe(self)
+			channel.leaveMulticast(self)
+		task = self.clientInfo.pop('task', None)
+		if task is not None:
+			task.cancel()
+		timer = self.clientInfo.pop('timer', None)
+		if timer is not None:
+			timer.cancel()
+		self.clientInfo.pop('sender', None)
+		for name in ('transport', 'rtcpTransport'):
+			transport = self.clientInfo.pop(name, None)
+			if transport is not None:
+				transport.close()
+
+	def deliver(self, packets):
+		"""Hand a channel frame to the event loop; transports are not thread-safe."""
+		self.loop.call_soon_threadsafe(ServerWorker.deliver, self, packets)
+
+	def sendRtcp(self, data):
+		transport = self.clientInfo.get('rtcpTransport')
+		if transport is not None:
+			transport.sendto(data)
+
+	def recvRtcp(self):
+		# RR được RtcpProtocol nhận ngay khi đến
+		pass
+
+	def localAddress(self):
+		return self.writer.get_extra_info('sockname')[0]
+
+	def sendRtsp(self, data):
+		"""Write raw bytes on the RTSP stream."""
+		self.writer.write(data)
+
+
+class AsyncServer:
+	"""Single-threaded RTSP/RTP server holding every session in one event loop."""
+
+	async def handleClient(self, reader, writer):
+		await AsyncServerWorker(reader, writer).run()
+
+	async def serve(self, port, rtspSocket=None):
+		if rtspSocket is not None:
+			# Socket đã bind sẵn (chế độ nhiều tiến trình)
+			server = await asyncio.start_server(self.handleClient, sock=rtspSocket, backlog=LISTEN_BACKLOG)
+		else:
+			server = await asyncio.start_server(self.handleClient, '', port, backlog=LISTEN_BACKLOG)
+		async with server:
+			await server.serve_forever()
+
+	def main(self, port, rtspSocket=None):
+		try:
+			asyncio.run(self.serve(port, rtspSocket))
+		except KeyboardInterrupt:
+			pass
@@ -0,0 +1,417 @@
+import os, stat, socket, threading, select, heapq
+from collections import deque
+from random import randint
+
+from MediaStore import mediaStore
+from PacketCache import fragmentFrame, patchHeader
+from Fec import addParity
+from RtpSender import RtpSender
+from FrameScheduler import frameScheduler
+from VideoStream import DEFAULT_FRAME_RATE
+from Metrics import metrics
+
+# SETUP live/<tên file hoặc FIFO> để xem kênh phát chung thay vì phát riêng từ đầu
+CHANNEL_PREFIX = 'live/'
+# Kích thước mỗi lần đọc từ nguồn trực tiếp
+LIVE_CHUNK = 65536
+# Số frame trực tiếp được giữ khi nguồn nhanh hơn tốc độ phát; frame cũ hơn bị bỏ
+LIVE_BACKLOG = 2
+# Khoảng chờ dữ liệu (s) của luồng đọc nguồn trực tiếp, để close() có hiệu lực cả khi chưa có writer
+LIVE_POLL = 0.5
+
+# Nhóm multicast mặc định (administratively scoped); mỗi kênh dùng một cổng RTP riêng
+MULTICAST_GROUP = '239.255.42.42'
+MULTICAST_PORT = 5004
+# TTL 1: gói không đi qua router, chỉ trong mạng LAN
+MULTICAST_TTL = 1
+# Cổng RTP chẵn cao nhất còn chỗ cho cổng RTCP ngay sau nó
+MAX_MULTICAST_PORT = 65534
+
+# Cửa sổ time-shift của mỗi kênh: giới hạn theo thời lượng (s, 0 = tắt) và theo byte
+TIMESHIFT_SECONDS = 0
+TIMESHIFT_BYTES = 64 * 1024 * 1024
+
+SOI = b'\xFF\xD8'
+EOI = b'\xFF\xD9'
+
+
+class PortPool:
+	"""Even RTP ports (RTCP on the next one) handed out to multicast outputs and reused once released."""
+
+	def __init__(self, firstPort=MULTICAST_PORT, lastPort=MAX_MULTICAST_PORT):
+		self.firstPort = firstPort + (firstPort & 1)
+		self.lastPort = lastPort
+		self.nextPort = self.firstPort
+		self.free = []
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		"""Return a free port pair; IOError if every pair is in use."""
+		with self.lock:
+			if self.free:
+				# Dùng lại cổng thấp nhất đã được trả
+				return heapq.heappop(self.free)
+			if self.nextPort > self.lastPort:
+				raise IOError("no free multicast port")
+			port = self.nextPort
+			self.nextPort += 2
+			return port
+
+	def release(self, port):
+		with self.lock:
+			heapq.heappush(self.free, port)
+
+
+class LiveSource:
+	"""Live MJPEG source (e.g. a FIFO) of back-to-back JPEGs, read on its own thread.
+
+	The FIFO is opened non-blocking, so SETUP never waits for a writer; the
+	reader thread waits for data instead and stops at end of stream.
+	"""
+
+	def __init__(self, filename, frameRate=DEFAULT_FRAME_RATE):
+		self.filename = filename
+		self.frameRate = frameRate
+		self.frames = deque(maxlen=LIVE_BACKLOG)
+		self.finished = False
+		self.running = True
+		# open() thường chặn tới khi có writer, trong lúc giữ khoá của ChannelHub (và cả event loop với --async)
+		self.fd = os.open(filename, os.O_RDONLY | os.O_NONBLOCK)
+		threading.Thread(target=self.run, name="LiveSource", daemon=True).start()
+
+	def run(self):
+		buf = bytearray()
+		try:
+			while self.running:
+				# Chưa có writer thì FIFO không sẵn sàng đọc; hết khoảng chờ thì kiểm tra lại running
+				if not select.select([self.fd], [], [], LIVE_POLL)[0]:
+					continue
+				try:
+					chunk = os.read(self.fd, LIVE_CHUNK)
+				except BlockingIOError:
+					continue
+				if not chunk:
+					break
+				buf += chunk
+				# Tách từng JPEG từ SOI tới EOI
+				while True:
+					start = buf.find(SOI)
+					if start < 0:
+						del buf[:max(0, len(buf) - 1)]
+						break
+					end = buf.find(EOI, start + 2)
+					if end < 0:
+						del buf[:start]
+						break
+					self.frames.append(bytes(buf[start:end + 2]))
+					del buf[:end + 2]
+		except OSError:
+			pass
+		finally:
+			self.finished = True
+			os.close(self.fd)
+
+	def nextFrame(self):
+		"""Return the oldest buffered frame, or None if nothing new has arrived."""
+		try:
+			return self.frames.popleft()
+		except IndexError:
+			return None
+
+	def close(self):
+		self.running = False
+
+
+class MulticastOutput:
+	"""Channel subscriber that sends every frame once to a multicast group."""
+
+	# Như ServerWorker.fecGroup: một gói parity cho mỗi nhóm fecGroup gói (0 = tắt)
+	fecGroup = 0
+
+	def __init__(self, group, port, ttl, interface):
+		self.address = (group, port)
+		self.ttl = ttl
+		self.seqnum = 0
+		self.fecSeq = 0
+		self.ssrc = randint(0, 0xFFFFFFFF)
+		# Số khung hình gửi lỗi: chỉ in lỗi đầu tiên, không in ở mỗi khung hình
+		self.sendErrors = 0
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+		# Người xem trên cùng máy (kể cả loopback) cũng nhận được gói
+		self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+		self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+		self.sender = RtpSender(self.sock, self.address)
+
+	def transport(self):
+		"""Value of the Transport header sent back in the SETUP reply."""
+		return 'RTP/AVP;multicast;destination=%s;port=%d;ttl=%d' % (self.address[0], self.address[1], self.ttl)
+
+	def sendFragments(self, fragments, timestamp):
+		packets = []
+		for template, payload in fragments:
+			self.seqnum += 1
+			packets.append((patchHeader(template, self.seqnum, timestamp, self.ssrc), payload))
+		if self.fecGroup and packets:
+			packets, self.fecSeq = addParity(packets, fragments, timestamp, self.ssrc,
+				self.seqnum - len(packets) + 1, self.fecSeq, self.fecGroup)
+		started = metrics.start()
+		try:
+			self.sender.sendFrame(packets)
+		except OSError as e:
+			metrics.count('server.errors')
+			self.sendErrors += 1
+			if self.sendErrors == 1:
+				print("Multicast send error: %s (further errors are only counted)" % e)
+		if started:
+			metrics.stop('server.send', started)
+			metrics.count('server.frames')
+			metrics.count('server.packets', len(packets))
+			metrics.count('server.bytes', sum(len(header) + len(payload) for header, payload in packets))
+
+	def close(self):
+		if self.sendErrors > 1:
+			print("Multicast %s:%d: %d frames not sent" % (self.address[0], self.address[1], self.sendErrors))
+		self.sock.close()
+
+
+class TimeShiftBuffer:
+	"""The last frames of a channel, bounded by duration and by bytes.
+
+	Frames are the channel's packetized fragments, shared with the live
+	subscribers and every session playing behind live; the oldest are evicted
+	as new ones arrive. Channel timestamps go up by one per frame, so a
+	timestamp maps directly to a position in the window.
+	"""
+
+	def __init__(self, frameRate, maxSeconds, maxBytes):
+		self.maxFrames = max(1, int(maxSeconds * frameRate))
+		self.maxBytes = maxBytes
+		self.frames = deque() # (fragments, số byte)
+		self.first = None # timestamp của frame cũ nhất
+		self.bytes = 0
+		self.evicted = 0
+		self.lock = threading.Lock()
+
+	def appendLocked(self, timestamp, fragments):
+		size = sum(len(template) + len(payload) for template, payload in fragments)
+		if self.first is None or not self.frames:
+			self.first = timestamp
+		self.frames.append((fragments, size))
+		self.bytes += size
+		while len(self.frames) > 1 and (len(self.frames) > self.maxFrames or self.bytes > self.maxBytes):
+			self.bytes -= self.frames.popleft()[1]
+			self.first += 1
+			self.evicted += 1
+
+	def window(self):
+		"""Return (oldest, newest) timestamps in the window, or None if empty."""
+		with self.lock:
+			if not self.frames:
+				return None
+			return self.first, self.first + len(self.frames) - 1
+
+	def stats(self):
+		window = self.window()
+		return {'frames': len(self.frames), 'bytes': self.bytes, 'evicted': self.evicted,
+			'oldest': window and window[0], 'newest': window and window[1]}
+
+
+class BroadcastChannel:
+	"""Reads and packetizes each frame once, then sends it to every subscribed session.
+
+	Subscribers only rewrite sequence number and SSRC in the shared header
+	templates. A session that subscribes mid-frame starts at the next frame.
+
+	With a time-shift window the channel runs from the first SETUP until the
+	last session leaves, keeping its recent frames so a session can PLAY from
+	an earlier position (replay) and rejoin live when it catches up.
+	"""
+
+	def __init__(self, name, multicastGroup=MULTICAST_GROUP, ports=None, multicastTtl=MULTICAST_TTL,
+			timeshiftSeconds=TIMESHIFT_SECONDS, timeshiftBytes=TIMESHIFT_BYTES):
+		self.name = name
+		self.multicastGroup = multicastGroup
+		self.ports = ports if ports is not None else PortPool()
+		self.multicastTtl = multicastTtl
+		self.multicast = None
+		self.multicastPort = None
+		self.multicastViewers = set()
+		path = os.path.abspath(name)
+		try:
+			isFifo = stat.S_ISFIFO(os.stat(path).st_mode)
+		except OSError:
+			raise IOError
+		if isFifo:
+			self.source = LiveSource(path)
+		else:
+			self.source = mediaStore.openStream(path)
+		self.frameRate = self.source.frameRate
+		self.subscribers = () # thay cả tuple khi đổi để tick đọc không cần khoá
+		self.lock = threading.Lock()
+		self.refCount = 0
+		self.timestamp = 0
+		self.timeshift = None
+		if timeshiftSeconds > 0:
+			self.timeshift = TimeShiftBuffer(self.frameRate, timeshiftSeconds, timeshiftBytes)
+			# Ghi liên tục, kể cả khi không ai đang xem trực tiếp
+			frameScheduler.add(self)
+
+	def subscribe(self, session):
+		"""Start sending frames to a session; the channel runs while it has subscribers."""
+		with self.lock:
+			if session in self.subscribers:
+				return
+			self.subscribers += (session,)
+			if len(self.subscribers) == 1 and self.timeshift is None:
+				frameScheduler.add(self)
+
+	def unsubscribe(self, session):
+		with self.lock:
+			if session not in self.subscribers:
+				return
+			self.subscribers = tuple(s for s in self.subscribers if s is not session)
+			if not self.subscribers and self.timeshift is None:
+				frameScheduler.remove(self)
+
+	def openMulticast(self, interface):
+		"""Return the channel's multicast output, creating it on first use."""
+		with self.lock:
+			if self.multicast is None:
+				# Chỉ kênh có người xem multicast mới giữ một cặp cổng
+				port = self.ports.acquire()
+				try:
+					self.multicast = MulticastOutput(self.multicastGroup, port, self.multicastTtl, interface)
+				except Exception:
+					self.ports.release(port)
+					raise
+				self.multicastPort = port
+			return self.multicast
+
+	def joinMulticast(self, session):
+		"""Count a playing multicast viewer; the group is fed while there is at least one."""
+		with self.lock:
+			self.multicastViewers.add(session)
+			first = len(self.multicastViewers) == 1
+		if first:
+			self.subscribe(self.multicast)
+
+	def leaveMulticast(self, session):
+		with self.lock:
+			if session not in self.multicastViewers:
+				return
+			self.multicastViewers.discard(session)
+			last = not self.multicastViewers
+		if last:
+			self.unsubscribe(self.multicast)
+
+	def nextFragments(self):
+		"""Packetize the next frame of the source. Return None if no frame is ready."""
+		source = self.source
+		if isinstance(source, LiveSource):
+			frame = source.nextFrame()
+			return fragmentFrame(frame) if frame else None
+		fragments = source.nextFragments()
+		if fragments is None:
+			# File thường: kênh phát lặp lại từ đầu
+			source.seek(0)
+			fragments = source.nextFragments()
+		return fragments
+
+	# Được gọi bởi FrameScheduler khi kênh có người xem
+	def tick(self, deadline):
+		"""Send one frame to every subscriber. Return the next deadline, or None to stop."""
+		interval = 1.0 / self.frameRate
+		started = metrics.start()
+		fragments = self.nextFragments()
+		metrics.stop('server.read', started)
+		if fragments is None:
+			if isinstance(self.source, LiveSource) and not self.source.finished:
+				return deadline + interval
+			print("Channel %s: end of source." % self.name)
+			return None
+
+		# Timestamp tăng liên tục, kể cả khi file được phát lại từ đầu
+		self.timestamp += 1
+		if self.timeshift is not None:
+			with self.timeshift.lock:
+				self.timeshift.appendLocked(self.timestamp, fragments)
+		# Đọc danh sách sau khi thêm vào cửa sổ: session vừa chuyển từ replay sang trực tiếp nhận đúng frame này
+		for session in self.subscribers:
+			session.sendFragments(fragments, self.timestamp)
+		return deadline + interval
+
+	def startPosition(self, frame):
+		"""Clamp a requested frame (from a PLAY Range) to the time-shift window.
+
+		Return the timestamp to replay from, or None to play live.
+		"""
+		window = None if self.timeshift is None else self.timeshift.window()
+		if frame is None or window is None:
+			return None
+		oldest, newest = window
+		if frame > newest:
+			return None
+		return max(frame, oldest)
+
+	def replay(self, session, timestamp):
+		"""Fragments of the frame at timestamp for a session playing behind live.
+
+		Return (timestamp, fragments); a position that was evicted moves up to the
+		oldest frame. At the live edge the session is subscribed and None is returned.
+		"""
+		timeshift = self.timeshift
+		with timeshift.lock:
+			if timeshift.frames:
+				timestamp = max(timestamp, timeshift.first)
+				index = timestamp - timeshift.first
+				if index < len(timeshift.frames):
+					return timestamp, timeshift.frames[index][0]
+			# Đã bắt kịp: frame kế tiếp sẽ đến qua tick() của kênh
+			self.subscribe(session)
+		return None
+
+	def close(self):
+		frameScheduler.remove(self)
+		self.source.close()
+		if self.multicast is not None:
+			self.multicast.close()
+			self.ports.release(self.multicastPort)
+
+
+class ChannelHub:
+	"""Process-wide registry of broadcast channels, shared by name."""
+
+	def __init__(self, multicastGroup=MULTICAST_GROUP, multicastPort=MULTICAST_PORT, multicastTtl=MULTICAST_TTL):
+		self.channels = {}
+		self.lock = threading.Lock()
+		self.multicastGroup = multicastGroup
+		# Cặp cổng RTP/RTCP riêng cho mỗi kênh đang phát multicast
+		self.ports = PortPool(multicastPort)
+		self.multicastTtl = multicastTtl
+		self.timeshiftSeconds = TIMESHIFT_SECONDS
+		self.timeshiftBytes = TIMESHIFT_BYTES
+
+	def open(self, name):
+		"""Return the channel for a source, starting it on first use."""
+		with self.lock:
+			channel = self.channels.get(name)
+			if channel is None:
+				channel = BroadcastChannel(name, self.multicastGroup, self.ports, self.multicastTtl,
+					self.timeshiftSeconds, self.timeshiftBytes)
+				self.channels[name] = channel
+			channel.refCount += 1
+			return channel
+
+	def release(self, channel):
+		"""Drop a reference; the last one stops the channel."""
+		with self.lock:
+			channel.refCount -= 1
+			if channel.refCount > 0:
+				return
+			if self.channels.get(channel.name) is channel:
+				del self.channels[channel.name]
+		channel.close()
+
+
+channelHub = ChannelHub()
@@ -1,6 +1,7 @@
 import sys
 from tkinter import Tk
 from Client import Client
+from Metrics import metrics
 
 if __name__ == "__main__":
 	try:
@@ -8,15 +9,23 @@ if __name__ == "__main__":
 		serverPort = sys.argv[2]
 		rtpPort = sys.argv[3]
 		fileName = sys.argv[4]	
+		# --cache: ghi từng khung hình ra cache-<session>.jpg (debug)
+		debugCache = '--cache' in sys.argv[5:]
+		# --low-latency: luôn hiện frame mới nhất, bỏ qua frame tồn đọng
+		lowLatency = '--low-latency' in sys.argv[5:]
+		# --multicast: nhận kênh phát chung qua nhóm multicast do server chọn
+		multicast = '--multicast' in sys.argv[5:]
+		# --metrics: đo thời gian nhận, ghép, giải mã, hiển thị; in khi Teardown
+		metrics.enabled = '--metrics' in sys.argv[5:]
 	except:
-		print("[Usage: ClientLauncher.py Server_name Server_port RTP_port Video_file]\n")	
+		print("[Usage: ClientLauncher.py Server_name Server_port RTP_port Video_file [--cache] [--low-latency] [--multicast] [--metrics]]\n")	
 
 	# Root là cửa sổ chính của ứng dụng Tkinter
 	# Client được tạo sẽ dùng root để gắn các widget như button, label, canvas… lên cửa sổ chính.
 	root = Tk()
 	
 	# Create a new client
-	app = Client(root, serverAddr, serverPort, rtpPort, fileName) # Tạo một đối tượng Client với các tham số đã cung cấp
+	app = Client(root, serverAddr, serverPort, rtpPort, fileName, debugCache, lowLatency, multicast) # Tạo một đối tượng Client với các tham số đã cung cấp
 	app.master.title("RTPClient")	# Đặt tiêu đề cho cửa sổ chính
 	root.mainloop() # Khởi động vòng lặp chính của giao diện Tkinter để lắng nghe và xử lý các sự kiện: bấm nút, đóng cửa sổ…
 	
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""XOR parity FEC for RTP fragments, in the style of RFC 5109.
+
+Every group of up to MAX_GROUP consecutive fragments of a frame gets one parity
+packet: payload type FEC_PT, its own sequence numbers, the frame's timestamp,
+and a 14-byte FEC header (RFC 5109 section 7.3 with L=0) followed by the XOR of
+the group's payloads. A receiver missing exactly one packet of a group rebuilds
+it from the parity and the others, without a retransmission.
+"""
+import struct, threading
+from collections import OrderedDict
+
+from RtpPacket import HEADER, HEADER_SIZE
+
+# Payload type động của các gói FEC (khác PT 26 của MJPEG)
+FEC_PT = 127
+# E/L/P/X/CC, M/PT recovery, SN base, TS recovery, length recovery
+FEC_HEADER = struct.Struct('!BBHIH')
+# FEC level 0 (L=0): protection length, mask 16 bit
+FEC_LEVEL = struct.Struct('!HH')
+FEC_HEADER_SIZE = FEC_HEADER.size + FEC_LEVEL.size
+# Mask 16 bit: một nhóm bảo vệ tối đa 16 gói
+MAX_GROUP = 16
+# Số frame được giữ parity trong cache dùng chung giữa các session
+PARITY_CACHE_FRAMES = 256
+
+
+class ParityGroup:
+	"""Session-independent part of one parity packet."""
+	__slots__ = ('first', 'count', 'mptRecovery', 'lengthRecovery', 'parity')
+
+	def __init__(self, first, count, mptRecovery, lengthRecovery, parity):
+		self.first = first # chỉ số fragment đầu tiên trong frame
+		self.count = count
+		self.mptRecovery = mptRecovery
+		self.lengthRecovery = lengthRecovery
+		self.parity = parity # XOR các payload, đệm 0 tới payload dài nhất
+
+
+def xorPayloads(payloads, length):
+	"""XOR payloads as if each were zero-padded to length bytes."""
+	acc = 0
+	for payload in payloads:
+		acc ^= int.from_bytes(payload, 'big') << (8 * (length - len(payload)))
+	return acc
+
+
+def buildGroups(fragments, groupSize):
+	groups = []
+	for first in range(0, len(fragments), groupSize):
+		group = fragments[first:first + groupSize]
+		mpt = length = protection = 0
+		for template, payload in group:
+			mpt ^= template[1]
+			length ^= len(payload)
+			protection = max(protection, len(payload))
+		parity = xorPayloads([payload for _, payload in group], protection).to_bytes(protection, 'big')
+		groups.append(ParityGroup(first, len(group), mpt, length, parity))
+	return tuple(groups)
+
+
+class ParityCache:
+	"""Parity of recently sent frames, shared by every session sending them.
+
+	Keyed by the fragments tuple from the packet cache or channel, which is the
+	same object for every session; the entry keeps it alive so its id stays valid.
+	"""
+
+	def __init__(self, maxFrames=PARITY_CACHE_FRAMES):
+		self.maxFrames = maxFrames
+		self.frames = OrderedDict()
+		self.lock = threading.Lock()
+
+	def groups(self, fragments, groupSize):
+		key = (id(fragments), groupSize)
+		with self.lock:
+			entry = self.frames.get(key)
+			if entry is not None and entry[0] is fragments:
+				self.frames.move_to_end(key)
+				return entry[1]
+		# XOR ngoài khoá; hai session cùng tính một frame thì chỉ tốn thêm một lần
+		groups = buildGroups(fragments, groupSize)
+		with self.lock:
+			self.frames[key] = (fragments, groups)
+			if len(self.frames) > self.maxFrames:
+				self.frames.popitem(last=False)
+		return groups
+
+
+parityCache = ParityCache()
+
+
+def addParity(packets, fragments, timestamp, ssrc, firstSeq, fecSeq, groupSize):
+	"""Insert a parity packet after each group of groupSize media packets of a frame.
+
+	packets are the frame's (header, payload) pairs numbered from firstSeq.
+	Return (packets with parity, last FEC sequence number used).
+	"""
+	groupSize = min(groupSize, MAX_GROUP)
+	result = []
+	for group in parityCache.groups(fragments, groupSize):
+		first, count = group.first, group.count
+		result.extend(packets[first:first + count])
+		fecSeq += 1
+		header = bytearray(HEADER_SIZE + FEC_HEADER_SIZE)
+		HEADER.pack_into(header, 0, 0x80, FEC_PT, fecSeq & 0xFFFF, timestamp & 0xFFFFFFFF, ssrc & 0xFFFFFFFF)
+		# Cả nhóm cùng timestamp: XOR của count giá trị giống nhau
+		FEC_HEADER.pack_into(header, HEADER_SIZE, 0, group.mptRecovery, (firstSeq + first) & 0xFFFF,
+			timestamp & 0xFFFFFFFF if count & 1 else 0, group.lengthRecovery)
+		FEC_LEVEL.pack_into(header, HEADER_SIZE + FEC_HEADER.size, len(group.parity),
+			((1 << count) - 1) << (MAX_GROUP - count))
+		result.append((header, group.parity))
+	return result, fecSeq
+
+
+def decodeParity(data):
+	"""Parse an FEC packet (without its RTP header).
+
+	Return (SN base, list of protected offsets, M/PT recovery, length recovery, parity payload),
+	or None if the packet is malformed.
+	"""
+	if len(data) < FEC_HEADER_SIZE:
+		return None
+	flags, mptRecovery, snBase, _, lengthRecovery = FEC_HEADER.unpack_from(data)
+	protection, mask = FEC_LEVEL.unpack_from(data, FEC_HEADER.size)
+	# Chỉ hỗ trợ một mức bảo vệ với mask 16 bit (E=0, L=0), như addParity gửi
+	if flags & 0xC0 or not mask or len(data) != FEC_HEADER_SIZE + protection:
+		return None
+	offsets = [i for i in range(MAX_GROUP) if mask & (0x8000 >> i)]
+	parity = data[FEC_HEADER_SIZE:]
+	return snBase, offsets, mptRecovery, lengthRecovery, parity
+
+
+def recoverPayload(parity, payloads, lengthRecovery):
+	"""Rebuild the one missing payload of a group from the parity and the others.
+
+	Return None if the lengths do not fit the parity (a malformed FEC packet).
+	"""
+	protection = len(parity)
+	length = lengthRecovery
+	for payload in payloads:
+		if len(payload) > protection:
+			return None
+		length ^= len(payload)
+	if length > protection:
+		return None
+	acc = int.from_bytes(parity, 'big') ^ xorPayloads(payloads, protection)
+	return acc.to_bytes(protection, 'big')[:length]
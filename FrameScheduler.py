@@ -0,0 +1,92 @@
+import heapq, itertools, threading
+from time import monotonic
+
+from Metrics import metrics
+
+# Nếu bị trễ quá mức này (s), đặt lại mốc thời gian thay vì gửi dồn để đuổi kịp
+MAX_LAG = 1.0
+
+
+class FrameScheduler:
+	"""One thread that paces every playing session from a heap of deadlines.
+
+	A session is any object with tick(deadline), which sends what is due and returns
+	its next absolute deadline (time.monotonic clock), or None to stop.
+	"""
+
+	def __init__(self):
+		self.heap = []
+		self.entries = {}
+		self.counter = itertools.count()
+		self.cond = threading.Condition()
+		self.thread = None
+
+	def add(self, session, deadline=None):
+		"""Start pacing a session; its first tick is at deadline (default: now)."""
+		if deadline is None:
+			deadline = monotonic()
+		with self.cond:
+			self.cancelLocked(session)
+			self.pushLocked(session, deadline)
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run, name="FrameScheduler", daemon=True)
+				self.thread.start()
+			self.cond.notify()
+
+	def remove(self, session):
+		"""Stop pacing a session."""
+		with self.cond:
+			self.cancelLocked(session)
+
+	def pushLocked(self, session, deadline):
+		entry = [deadline, next(self.counter), session, True]
+		self.entries[id(session)] = entry
+		heapq.heappush(self.heap, entry)
+
+	def cancelLocked(self, session):
+		entry = self.entries.pop(id(session), None)
+		if entry is not None:
+			entry[3] = False
+
+	def run(self):
+		heap = self.heap
+		while True:
+			with self.cond:
+				while True:
+					# Bỏ các phiên đã bị huỷ ở đầu heap
+					while heap and not heap[0][3]:
+						heapq.heappop(heap)
+					if not heap:
+						self.cond.wait()
+						continue
+					delay = heap[0][0] - monotonic()
+					if delay <= 0:
+						break
+					self.cond.wait(delay)
+				entry = heapq.heappop(heap)
+				deadline, session = entry[0], entry[2]
+			if metrics.enabled:
+				# Gửi muộn bao lâu so với mốc thời gian của gói
+				metrics.observe('server.lateness', monotonic() - deadline)
+
+			try:
+				nextDeadline = session.tick(deadline)
+			except Exception as e:
+				metrics.count('server.errors')
+				print(f"Scheduler: session error: {e}")
+				nextDeadline = None
+
+			with self.cond:
+				# Phiên có thể đã bị huỷ (PAUSE/TEARDOWN) hoặc thêm lại trong lúc tick
+				if self.entries.get(id(session)) is not entry:
+					continue
+				if nextDeadline is None:
+					del self.entries[id(session)]
+					continue
+				now = monotonic()
+				if nextDeadline < now - MAX_LAG:
+					nextDeadline = now
+				self.pushLocked(session, nextDeadline)
+
+
+frameScheduler = FrameScheduler()
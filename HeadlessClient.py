@@ -0,0 +1,148 @@
+"""Client without GUI: receives and reassembles frames but never decodes them.
+
+Imports neither tkinter nor PIL, so it runs on servers and in load tests.
+
+Usage: HeadlessClient.py Server_name Server_port RTP_port Video_file [Seconds] [--multicast]
+"""
+import sys, threading, time
+from array import array
+
+from RtspClient import RtspClient
+
+
+def percentile(values, fraction):
+	"""Nearest-rank percentile of a sorted sequence (None if empty)."""
+	if not values:
+		return None
+	return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class HeadlessClient(RtspClient):
+	"""RtspClient that only measures the frames it receives.
+
+	Startup is the time from sending SETUP to the first complete frame. Frame delay
+	is how much later than the earliest frame (relative to the RTP clock) each frame
+	was complete, i.e. the one-way delay variation a player would have to absorb.
+	"""
+	verbose = False
+	# Hàng trăm session trong một tiến trình: ít slot hơn cho mỗi session
+	RECEIVE_SLOTS = 256
+
+	def __init__(self, serveraddr, serverport, rtpport, filename, multicast=False):
+		self.setupSent = None
+		self.firstFrame = None
+		self.lastFrame = None
+		self.frames = 0
+		self.bytes = 0
+		# arrival - timestamp / clockRate của từng frame
+		self.transits = array('d')
+		self.error = None
+		self.stopped = threading.Event()
+		super().__init__(serveraddr, serverport, rtpport, filename, multicast)
+
+	def warn(self, title, message):
+		self.error = message
+		if self.verbose:
+			print("%s: %s" % (title, message))
+
+	def setupMovie(self):
+		if self.state == self.INIT:
+			self.setupSent = time.monotonic()
+		super().setupMovie()
+
+	def queueFrames(self, frames):
+		if not frames:
+			return
+		now = time.monotonic()
+		for timestamp, frame in frames:
+			self.currentTimestamp = timestamp
+			self.frames += 1
+			self.bytes += len(frame)
+			self.transits.append(now - timestamp / self.clockRate)
+		if self.firstFrame is None:
+			self.firstFrame = now
+		self.lastFrame = now
+
+	def startPlayback(self, stop):
+		self.stopped.clear()
+
+	def stopPlayback(self, stop):
+		# Lượt nhận cũ kết thúc muộn (PLAY ngay sau PAUSE) không đánh dấu lượt mới đã dừng
+		if stop is self.playbackStop:
+			self.stopped.set()
+
+	def waitFor(self, state, timeout):
+		"""Wait until the RTSP state is reached. Return False on timeout."""
+		deadline = time.monotonic() + timeout
+		while self.state != state:
+			if time.monotonic() >= deadline or self.error is not None:
+				return False
+			time.sleep(0.01)
+		return True
+
+	def close(self):
+		"""Close the sockets left open after TEARDOWN (the GUI client exits instead)."""
+		if hasattr(self, 'playbackStop'):
+			# Chờ thread nhận RTP thoát trước khi đóng socket của nó
+			self.stopped.wait(1.0)
+		for name in ('rtpSocket', 'rtspSocket'):
+			sock = getattr(self, name, None)
+			if sock is not None:
+				sock.close()
+
+	def delays(self):
+		"""Sorted frame delays (s) relative to the earliest frame."""
+		if not self.transits:
+			return []
+		base = min(self.transits)
+		return sorted(transit - base for transit in self.transits)
+
+	def report(self):
+		"""Return the session's measurements as a dict."""
+		jitterBuffer = getattr(self, 'jitterBuffer', None)
+		expected = lost = dropped = recovered = 0
+		if jitterBuffer is not None and jitterBuffer.highestSeq is not None:
+			expected = jitterBuffer.highestSeq - jitterBuffer.baseSeq + 1
+			lost = jitterBuffer.lost()
+			dropped = jitterBuffer.framesDropped
+			recovered = jitterBuffer.recovered
+		elapsed = 0.0
+		if self.firstFrame is not None:
+			elapsed = self.lastFrame - self.firstFrame
+		delays = self.delays()
+		return {
+			'session': self.sessionId,
+			'frames': self.frames,
+			'bytes': self.bytes,
+			'fps': (self.frames - 1) / elapsed if elapsed > 0 else 0.0,
+			'packetsLost': lost,
+			'loss': lost / expected if expected else 0.0,
+			'framesDropped': dropped,
+			'recovered': recovered,
+			'startup': None if self.firstFrame is None else self.firstFrame - self.setupSent,
+			'delayP50': percentile(delays, 0.50),
+			'delayP95': percentile(delays, 0.95),
+			'delayP99': percentile(delays, 0.99),
+			'error': self.error,
+		}
+
+
+if __name__ == "__main__":
+	try:
+		serverAddr, serverPort, rtpPort, fileName = sys.argv[1:5]
+		seconds = float(sys.argv[5]) if len(sys.argv) > 5 and not sys.argv[5].startswith('--') else 10.0
+	except ValueError:
+		print(__doc__)
+		sys.exit(1)
+
+	client = HeadlessClient(serverAddr, serverPort, rtpPort, fileName, '--multicast' in sys.argv[5:])
+	client.verbose = True
+	if client.error is None:
+		client.setupMovie()
+		if client.waitFor(client.READY, 5.0):
+			client.playMovie()
+			time.sleep(seconds)
+		client.exitClient()
+		client.waitFor(client.INIT, 2.0)
+	client.close()
+	print("Session:", client.report())
@@ -0,0 +1,270 @@
+from time import monotonic
+from collections import deque
+
+from Fec import decodeParity, recoverPayload
+
+SOI = b'\xFF\xD8'
+# Frame chưa đầy đủ quá lâu (s) thì bỏ, kể cả khi không có frame nào sau nó
+STALE_FRAME = 1.0
+# Số timestamp đã trả ra/bỏ được nhớ để nhận ra gói đến muộn
+RELEASED_HISTORY = 64
+
+
+def seqDiff(a, b):
+	"""Signed distance a - b between two 16-bit RTP sequence numbers."""
+	return ((a - b + 0x8000) & 0xFFFF) - 0x8000
+
+
+class PendingFrame:
+	__slots__ = ('timestamp', 'packets', 'firstSeq', 'markerSeq', 'arrival')
+
+	def __init__(self, timestamp, arrival):
+		self.timestamp = timestamp
+		self.packets = {}
+		self.firstSeq = None
+		self.markerSeq = None
+		self.arrival = arrival
+
+
+class JitterBuffer:
+	"""Reassemble RTP fragments into frames by sequence number.
+
+	Packets may arrive out of order within reorderWindow. A frame is released only
+	when every fragment from its first packet to its marker packet is present;
+	frames that cannot be completed before the playout delay runs out are dropped
+	so broken JPEGs never reach the decoder. Frames come out in sequence order.
+	FEC parity packets (pushParity) let it rebuild one missing fragment per
+	protected group before the frame is given up on.
+
+	With frameBuffers (a PacketRing.FrameBuffers) frames are assembled into
+	reusable buffers instead of new bytes objects; recycle, if given, is called
+	with the payloads of every packet the buffer is done with.
+	"""
+
+	def __init__(self, reorderWindow=64, clockRate=20, minDelay=0.02, maxDelay=0.5, frameBuffers=None, recycle=None):
+		self.reorderWindow = reorderWindow
+		self.clockRate = clockRate
+		self.minDelay = minDelay
+		self.maxDelay = maxDelay
+		self.frames = {} # timestamp -> PendingFrame
+		self.order = [] # timestamps theo thứ tự số thứ tự gói đầu tiên
+		self.highestSeq = None # số thứ tự mở rộng (extended) lớn nhất đã nhận
+		self.baseSeq = None
+		self.releasedSeq = None # gói cuối cùng của frame vừa được trả ra/bỏ
+		self.releasedTimestamps = deque(maxlen=RELEASED_HISTORY)
+		self.lastTransit = None
+		# Bộ đếm để tinh chỉnh độ sâu buffer
+		self.received = 0
+		self.reordered = 0
+		self.duplicates = 0
+		self.late = 0
+		self.framesCompleted = 0
+		self.framesDropped = 0
+		self.recovered = 0
+		self.malformed = 0
+		self.jitter = 0.0
+		self.playoutDelay = minDelay
+		self.frameBuffers = frameBuffers
+		self.recycle = recycle
+		# timestamp -> các nhóm FEC [seq đầu, offset, M/PT recovery, length recovery, parity] chưa dùng
+		self.parity = {}
+
+	def extend(self, seqnum):
+		"""Map a 16-bit sequence number to an extended (monotonic) one."""
+		if self.highestSeq is None:
+			return seqnum
+		return self.highestSeq + seqDiff(seqnum, self.highestSeq & 0xFFFF)
+
+	def push(self, seqnum, timestamp, marker, payload, arrival=None):
+		"""Add one RTP packet. Return the list of (timestamp, frame bytes) now ready."""
+		if arrival is None:
+			arrival = monotonic()
+		ext = self.extend(seqnum)
+		if self.highestSeq is None:
+			self.baseSeq = self.highestSeq = ext
+			# Gói đầu tiên nhận được chưa chắc là gói đầu tiên được gửi
+			self.releasedSeq = ext - 1 - self.reorderWindow
+		elif ext > self.highestSeq:
+			self.highestSeq = ext
+		else:
+			self.reordered += 1
+			self.baseSeq = min(self.baseSeq, ext)
+
+		if ext <= self.releasedSeq or timestamp in self.releasedTimestamps:
+			# Frame của gói này đã được trả ra hoặc đã bị bỏ
+			self.late += 1
+			if self.recycle is not None:
+				self.recycle((payload,))
+			return self.poll(arrival)
+
+		frame = self.pendingFrame(timestamp, arrival)
+		if ext in frame.packets:
+			self.duplicates += 1
+			if self.recycle is not None:
+				self.recycle((payload,))
+			return self.poll(arrival)
+		self.received += 1
+		self.insert(frame, ext, marker, payload)
+		if timestamp in self.parity:
+			self.recover(frame)
+		return self.poll(arrival)
+
+	def pushParity(self, timestamp, data, arrival=None):
+		"""Add one FEC packet (data without its RTP header). Return the frames now ready."""
+		if arrival is None:
+			arrival = monotonic()
+		if self.highestSeq is None or timestamp in self.releasedTimestamps:
+			return self.poll(arrival)
+		fec = decodeParity(data)
+		if fec is None:
+			# Gói FEC hỏng: bỏ qua, không để nó làm dừng luồng nhận
+			self.malformed += 1
+			return self.poll(arrival)
+		snBase, offsets, mptRecovery, lengthRecovery, parity = fec
+		base = self.extend(snBase)
+		if base + offsets[-1] <= self.releasedSeq:
+			return self.poll(arrival)
+		groups = self.parity.get(timestamp)
+		if groups is None:
+			groups = self.parity[timestamp] = []
+			if len(self.parity) > RELEASED_HISTORY:
+				# Parity của frame mất hết gói không bao giờ được dùng
+				del self.parity[next(iter(self.parity))]
+		# Chép parity ra khỏi slot nhận để trả slot ngay
+		groups.append([base, offsets, mptRecovery, lengthRecovery, bytes(parity)])
+		frame = self.frames.get(timestamp)
+		if frame is None and len(offsets) == 1:
+			# Nhóm một gói: parity chính là payload, dựng lại được kể cả khi chưa có gói nào của frame.
+			# Chỉ tạo frame khi dựng lại được, vì poll() cần mỗi frame đang chờ có ít nhất một gói
+			payload = recoverPayload(parity, (), lengthRecovery)
+			if payload is None:
+				return self.poll(arrival)
+			frame = self.pendingFrame(timestamp, arrival)
+		if frame is not None:
+			self.recover(frame)
+		return self.poll(arrival)
+
+	def pendingFrame(self, timestamp, arrival):
+		frame = self.frames.get(timestamp)
+		if frame is None:
+			frame = PendingFrame(timestamp, arrival)
+			self.frames[timestamp] = frame
+			self.order.append(timestamp)
+			self.updateJitter(timestamp, arrival)
+		return frame
+
+	def insert(self, frame, ext, marker, payload):
+		frame.packets[ext] = payload
+		if marker:
+			frame.markerSeq = ext
+		if frame.firstSeq is None or ext < frame.firstSeq:
+			frame.firstSeq = ext
+		if len(self.order) > 1 and self.frames[self.order[-2]].firstSeq > frame.firstSeq:
+			self.order.sort(key=lambda ts: self.frames[ts].firstSeq)
+
+	def recover(self, frame):
+		"""Rebuild the missing packet of every FEC group of the frame that lacks exactly one."""
+		groups = self.parity.get(frame.timestamp)
+		if not groups:
+			return
+		packets = frame.packets
+		for group in list(groups):
+			base, offsets, mptRecovery, lengthRecovery, parity = group
+			missing = [base + offset for offset in offsets if base + offset not in packets]
+			if len(missing) > 1:
+				continue
+			groups.remove(group)
+			if not missing:
+				continue
+			ext = missing[0]
+			others = [base + offset for offset in offsets if base + offset != ext]
+			payload = recoverPayload(parity, [packets[s] for s in others], lengthRecovery)
+			if payload is None:
+				continue
+			# Marker của gói thiếu = bit M của M/PT recovery XOR marker của các gói còn lại
+			marker = (mptRecovery >> 7) ^ (frame.markerSeq in others)
+			# memoryview của bytes: recycle bỏ qua vì không thuộc slot nào
+			self.insert(frame, ext, marker, memoryview(payload))
+			self.highestSeq = max(self.highestSeq, ext)
+			self.recovered += 1
+
+	def updateJitter(self, timestamp, arrival):
+		"""RFC 3550 interarrival jitter (seconds) and the playout delay derived from it."""
+		transit = arrival - timestamp / self.clockRate
+		if self.lastTransit is not None:
+			d = abs(transit - self.lastTransit)
+			self.jitter += (d - self.jitter) / 16
+		self.lastTransit = transit
+		self.playoutDelay = min(self.maxDelay, max(self.minDelay, 4 * self.jitter))
+
+	def isComplete(self, frame):
+		if frame.markerSeq is None:
+			return False
+		first = frame.firstSeq
+		# Gói đầu tiên: nối tiếp frame trước, hoặc payload bắt đầu bằng SOI của JPEG
+		if first != self.releasedSeq + 1 and frame.packets[first][:2] != SOI:
+			return False
+		return len(frame.packets) == frame.markerSeq - first + 1
+
+	def poll(self, now=None):
+		"""Release complete frames and drop expired ones. Return ready (timestamp, bytes)."""
+		if now is None:
+			now = monotonic()
+		ready = []
+		while self.order:
+			frame = self.frames[self.order[0]]
+			if self.isComplete(frame):
+				ready.append((frame.timestamp, self.assemble(frame)))
+				self.framesCompleted += 1
+				self.release(frame, frame.markerSeq)
+				continue
+			# Frame sau đã bắt đầu mà frame này vẫn thiếu gói quá thời gian trễ phát cho phép
+			expired = len(self.order) > 1 and now - self.frames[self.order[1]].arrival > self.playoutDelay
+			expired = expired or now - frame.arrival > STALE_FRAME
+			# Đã nhận thêm hơn reorderWindow gói mà gói thiếu vẫn chưa tới
+			overflow = self.highestSeq - max(frame.packets) > self.reorderWindow
+			if expired or overflow:
+				# Thiếu gói: bỏ cả frame trước khi giải mã
+				self.framesDropped += 1
+				self.release(frame, max(frame.packets))
+				continue
+			break
+		return ready
+
+	def assemble(self, frame):
+		packets = frame.packets
+		parts = [packets[s] for s in range(frame.firstSeq, frame.markerSeq + 1)]
+		if self.frameBuffers is None:
+			return b''.join(parts)
+		return self.frameBuffers.assemble(parts, sum(map(len, parts)))
+
+	def release(self, frame, lastSeq):
+		if self.recycle is not None:
+			self.recycle(frame.packets.values())
+		del self.frames[frame.timestamp]
+		self.parity.pop(frame.timestamp, None)
+		self.order.pop(0)
+		self.releasedTimestamps.append(frame.timestamp)
+		self.releasedSeq = max(self.releasedSeq, lastSeq)
+
+	def lost(self):
+		"""Cumulative number of packets lost (expected minus received, as in RFC 3550)."""
+		if self.highestSeq is None:
+			return 0
+		return max(0, self.highestSeq - self.baseSeq + 1 - self.received)
+
+	def stats(self):
+		"""Return the loss/reorder counters as a dict."""
+		return {
+			'received': self.received,
+			'lost': self.lost(),
+			'reordered': self.reordered,
+			'duplicates': self.duplicates,
+			'late': self.late,
+			'framesCompleted': self.framesCompleted,
+			'framesDropped': self.framesDropped,
+			'recovered': self.recovered,
+			'malformed': self.malformed,
+			'jitter': self.jitter,
+			'playoutDelay': self.playoutDelay,
+		}
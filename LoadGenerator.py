@@ -0,0 +1,112 @@
+"""Run many headless client sessions against one server from a single process.
+
+Each session gets its own RTP/RTCP port pair (RTP_port, RTP_port + 2, ...), does
+SETUP and PLAY, receives for the given duration and tears down. The report has
+one line per session (frame rate, packet loss, startup time from SETUP to the
+first complete frame, frame delay percentiles) followed by the totals.
+
+Usage: LoadGenerator.py Server_name Server_port Video_file [--sessions N] [--duration S]
+	[--rtp-port P] [--ramp S] [--multicast] [--metrics]
+"""
+import sys, threading, time
+
+from HeadlessClient import HeadlessClient, percentile
+from Metrics import metrics
+
+# Thời gian chờ trả lời SETUP / TEARDOWN (s)
+REPLY_TIMEOUT = 5.0
+
+
+def option(options, name, default, type=int):
+	if name in options:
+		return type(options[options.index(name) + 1])
+	return default
+
+
+def runSession(client, stopAt):
+	"""SETUP, PLAY until stopAt, TEARDOWN."""
+	try:
+		client.setupMovie()
+		if not client.waitFor(client.READY, REPLY_TIMEOUT):
+			client.error = client.error or 'no SETUP reply'
+			return
+		client.playMovie()
+		time.sleep(max(0.0, stopAt - time.monotonic()))
+		client.exitClient()
+		client.waitFor(client.INIT, REPLY_TIMEOUT)
+	except OSError as e:
+		client.error = str(e)
+	finally:
+		client.close()
+
+
+def milliseconds(value):
+	return '-' if value is None else '%.1f' % (value * 1000)
+
+
+def printReport(clients):
+	print("%8s %7s %6s %7s %9s %8s %8s %8s" % ('session', 'frames', 'fps', 'loss%', 'startup', 'p50', 'p95', 'p99'))
+	reports = [client.report() for client in clients]
+	for report in reports:
+		if report['error']:
+			print("%8s error: %s" % (report['session'], report['error']))
+			continue
+		print("%8s %7d %6.1f %7.2f %9s %8s %8s %8s" % (report['session'], report['frames'], report['fps'],
+			report['loss'] * 100, milliseconds(report['startup']), milliseconds(report['delayP50']),
+			milliseconds(report['delayP95']), milliseconds(report['delayP99'])))
+
+	ok = [report for report in reports if not report['error'] and report['frames']]
+	startups = sorted(report['startup'] for report in ok)
+	delays = sorted(delay for client in clients for delay in client.delays())
+	print("\n%d/%d sessions received frames, %d frames, %.1f MB" % (len(ok), len(reports),
+		sum(report['frames'] for report in reports), sum(report['bytes'] for report in reports) / 1e6))
+	if ok:
+		print("fps: mean %.1f, min %.1f" % (sum(report['fps'] for report in ok) / len(ok), min(report['fps'] for report in ok)))
+		print("loss: mean %.2f%%, max %.2f%%" % (sum(report['loss'] for report in ok) * 100 / len(ok),
+			max(report['loss'] for report in ok) * 100))
+		recovered = sum(report['recovered'] for report in ok)
+		if recovered:
+			print("FEC: %d lost packets recovered" % recovered)
+		print("startup ms: p50 %s, p95 %s, max %s" % (milliseconds(percentile(startups, 0.5)),
+			milliseconds(percentile(startups, 0.95)), milliseconds(startups[-1])))
+		print("delay ms: p50 %s, p95 %s, p99 %s" % (milliseconds(percentile(delays, 0.5)),
+			milliseconds(percentile(delays, 0.95)), milliseconds(percentile(delays, 0.99))))
+	return len(ok) == len(reports)
+
+
+def main(argv):
+	try:
+		serverAddr, serverPort, fileName = argv[1:4]
+		options = argv[4:]
+		sessions = option(options, '--sessions', 100)
+		duration = option(options, '--duration', 10.0, float)
+		rtpPort = option(options, '--rtp-port', 25000)
+		ramp = option(options, '--ramp', 1.0, float)
+		multicast = '--multicast' in options
+		# Thời gian nhận/ghép gói của mọi session cộng chung, in sau bảng kết quả
+		metrics.enabled = '--metrics' in options
+	except (ValueError, IndexError):
+		print(__doc__)
+		return 1
+
+	clients = []
+	threads = []
+	start = time.monotonic()
+	for i in range(sessions):
+		# Trải đều thời điểm bắt đầu trong khoảng ramp để không dồn SETUP cùng lúc
+		time.sleep(max(0.0, start + ramp * i / sessions - time.monotonic()))
+		client = HeadlessClient(serverAddr, serverPort, rtpPort + 2 * i, fileName, multicast)
+		clients.append(client)
+		thread = threading.Thread(target=runSession, args=(client, time.monotonic() + duration), daemon=True)
+		thread.start()
+		threads.append(thread)
+	for thread in threads:
+		thread.join()
+	ok = printReport(clients)
+	if metrics.enabled:
+		print("\n" + metrics.text(), end='')
+	return 0 if ok else 1
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv))
@@ -0,0 +1,197 @@
+import mmap, os, threading
+from collections import OrderedDict
+
+from VideoStream import loadFrameIndex
+from PacketCache import PacketCache
+from Renditions import loadRenditions
+
+# Số asset không còn session nào dùng được giữ lại (LRU) trước khi đóng
+MAX_IDLE_ASSETS = 8
+
+
+class MediaAsset:
+	"""A video file mapped into memory once and shared by every session."""
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.file = open(filename, 'rb')
+		st = os.fstat(self.file.fileno())
+		self.key = (st.st_size, st.st_mtime_ns)
+		self.index = loadFrameIndex(filename)
+		self.format = self.index.format
+		self.frameRate = self.index.frameRate
+		self.refCount = 0
+		if st.st_size > 0:
+			self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+			self.view = memoryview(self.mmap)
+		else:
+			self.mmap = None
+			self.view = memoryview(b'')
+		# Cách chia gói RTP dùng chung cho mọi người xem asset này
+		self.packets = PacketCache(self)
+		self.renditionList = None
+		self.lock = threading.Lock()
+
+	def renditions(self):
+		"""Return the available renditions, best first (index 0 is this asset)."""
+		with self.lock:
+			if self.renditionList is None:
+				self.renditionList = loadRenditions(self, MediaAsset)
+			return self.renditionList
+
+	def frameCount(self):
+		"""Return the number of frames."""
+		return len(self.index)
+
+	def frame(self, frameIndex):
+		"""Return a zero-copy memoryview of a frame (0-based)."""
+		offset, length = self.index.frame(frameIndex)
+		return self.view[offset:offset + length]
+
+	def fragmentEnds(self, frameIndex, payloadSize):
+		"""Precomputed RTP fragment boundaries of a frame, if the container has them."""
+		return self.index.fragments(frameIndex, payloadSize)
+
+	def ready(self, frameIndex):
+		"""Fragments of a frame; a mapped file can always produce them right away."""
+		return self.packets.fragments(frameIndex)
+
+	def close(self):
+		"""Unmap the file."""
+		self.packets.clear()
+		for rendition in (self.renditionList or [])[1:]:
+			rendition.close()
+		try:
+			self.view.release()
+			if self.mmap is not None:
+				self.mmap.close()
+		except BufferError:
+			# Vẫn còn memoryview của khung hình đang được dùng: để GC giải phóng
+			pass
+		self.file.close()
+
+
+class AssetStream:
+	"""Per-session cursor over a shared MediaAsset, with the VideoStream interface."""
+
+	def __init__(self, store, asset):
+		self.store = store
+		self.asset = asset
+		self.filename = asset.filename
+		self.format = asset.format
+		self.frameRate = asset.frameRate
+		self.frameNum = 0
+		# Mức chất lượng được chọn (0 = file gốc) và mức của khung hình gửi gần nhất:
+		# rendition mã hoá lại khi cần có thể chưa sẵn sàng, khi đó vẫn gửi mức cũ
+		self.level = 0
+		self.sentLevel = 0
+
+	def nextFrame(self):
+		"""Get next frame as a memoryview into the shared mapping."""
+		asset = self.asset
+		if asset is None or self.frameNum >= asset.frameCount():
+			return None
+		data = asset.frame(self.frameNum)
+		self.frameNum += 1
+		return data
+
+	def nextFragments(self):
+		"""Get next frame as cached (header template, payload) fragments."""
+		asset = self.asset
+		if asset is None or self.frameNum >= asset.frameCount():
+			return None
+		fragments = None
+		level = self.level
+		if level:
+			renditions = asset.renditions()
+			fragments = renditions[level].ready(self.frameNum)
+			if fragments is None and self.sentLevel not in (0, level):
+				# Mức mới chưa mã hoá xong khung hình này: giữ mức đang gửi
+				level = self.sentLevel
+				fragments = renditions[level].ready(self.frameNum)
+		if fragments is None:
+			level = 0
+			fragments = asset.packets.fragments(self.frameNum)
+		self.sentLevel = level
+		self.frameNum += 1
+		return fragments
+
+	def renditionCount(self):
+		"""Number of quality levels available for this stream."""
+		return len(self.asset.renditions()) if self.asset is not None else 1
+
+	def seek(self, frameNumber):
+		"""Jump so that the next frame read is frameNumber (0-based)."""
+		self.frameNum = max(0, min(frameNumber, self.frameCount()))
+
+	def frameCount(self):
+		"""Get the total number of frames."""
+		return self.asset.frameCount() if self.asset is not None else 0
+
+	def frameNbr(self):
+		"""Get frame number."""
+		return self.frameNum
+
+	def close(self):
+		"""Release the shared asset."""
+		if self.asset is not None:
+			asset, self.asset = self.asset, None
+			self.store.release(asset)
+
+
+class MediaStore:
+	"""Process-wide, reference-counted store of memory-mapped assets."""
+
+	def __init__(self, maxIdle=MAX_IDLE_ASSETS):
+		self.maxIdle = maxIdle
+		self.assets = {}
+		self.idle = OrderedDict()
+		self.lock = threading.Lock()
+
+	def acquire(self, filename):
+		"""Return the shared asset for a file, mapping it on first use."""
+		path = os.path.abspath(filename)
+		try:
+			st = os.stat(path)
+		except OSError:
+			raise IOError
+		with self.lock:
+			asset = self.assets.get(path)
+			if asset is not None and asset.key != (st.st_size, st.st_mtime_ns):
+				# File đã thay đổi trên đĩa: asset cũ sẽ đóng khi session cuối cùng trả lại
+				del self.assets[path]
+				if self.idle.pop(path, None) is not None:
+					asset.close()
+				asset = None
+			if asset is None:
+				try:
+					asset = MediaAsset(path)
+				except (OSError, ValueError):
+					raise IOError
+				self.assets[path] = asset
+			self.idle.pop(path, None)
+			asset.refCount += 1
+			return asset
+
+	def release(self, asset):
+		"""Drop a reference; idle assets are closed in LRU order."""
+		path = asset.filename
+		with self.lock:
+			asset.refCount -= 1
+			if asset.refCount > 0:
+				return
+			if self.assets.get(path) is not asset:
+				asset.close()
+				return
+			self.idle[path] = asset
+			while len(self.idle) > self.maxIdle:
+				oldPath, oldAsset = self.idle.popitem(last=False)
+				del self.assets[oldPath]
+				oldAsset.close()
+
+	def openStream(self, filename):
+		"""Open a per-session stream over the shared asset."""
+		return AssetStream(self, self.acquire(filename))
+
+
+mediaStore = MediaStore()
@@ -0,0 +1,151 @@
+"""Counters and per-stage timing histograms for the server and the clients.
+
+Disabled by default. Instrumented code reads metrics.enabled (or calls start(),
+which returns 0 when disabled) before touching the clock, so a disabled build
+pays one attribute read per stage. Counters are updated without a lock: an
+increment racing on two threads can be lost, which is fine for monitoring.
+
+Stages are timed into log2 histograms of microseconds (bucket i holds values
+below 2**i us), so recording is a bit_length() and an index, and percentiles
+are accurate to a factor of two.
+"""
+import json, socket, threading
+from time import perf_counter
+
+# Ô cuối (2**BUCKETS us, khoảng 16 s) chứa mọi giá trị lớn hơn
+BUCKETS = 25
+
+
+class Histogram:
+	__slots__ = ('counts', 'count', 'total', 'max')
+
+	def __init__(self):
+		self.counts = [0] * (BUCKETS + 1)
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def observe(self, seconds):
+		self.counts[min(int(seconds * 1e6).bit_length(), BUCKETS)] += 1
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+
+	def percentile(self, fraction):
+		"""Upper bound (s) of the bucket holding the given fraction of the values."""
+		if not self.count:
+			return None
+		rank = fraction * self.count
+		seen = 0
+		for i, n in enumerate(self.counts):
+			seen += n
+			if seen >= rank and n:
+				return min((1 << i) / 1e6, self.max)
+		return self.max
+
+	def snapshot(self):
+		return {
+			'count': self.count,
+			'total': self.total,
+			'mean': self.total / self.count if self.count else None,
+			'p50': self.percentile(0.50),
+			'p90': self.percentile(0.90),
+			'p99': self.percentile(0.99),
+			'max': self.max,
+			# cận trên (us) -> số lần đo; chỉ các ô khác 0
+			'buckets': {1 << i: n for i, n in enumerate(self.counts) if n},
+		}
+
+
+class Metrics:
+	"""Process-wide registry of counters, gauges and stage histograms."""
+
+	def __init__(self):
+		self.enabled = False
+		self.counters = {}
+		self.histograms = {}
+		self.gauges = {} # tên -> hàm trả về giá trị hiện tại
+		self.server = None
+
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	def observe(self, name, seconds):
+		histogram = self.histograms.get(name)
+		if histogram is None:
+			histogram = self.histograms.setdefault(name, Histogram())
+		histogram.observe(seconds)
+
+	def start(self):
+		"""Clock reading to pass to stop(), or 0 when disabled."""
+		return perf_counter() if self.enabled else 0
+
+	def stop(self, name, started):
+		"""Record the time since start() under the stage name (no-op if disabled)."""
+		if started:
+			self.observe(name, perf_counter() - started)
+
+	def gauge(self, name, func):
+		"""Register a value read at dump time (e.g. the number of open sessions)."""
+		self.gauges[name] = func
+
+	def reset(self):
+		self.counters.clear()
+		self.histograms.clear()
+
+	def snapshot(self):
+		"""Return every metric as a JSON-serializable dict."""
+		return {
+			'counters': dict(self.counters),
+			'gauges': {name: func() for name, func in list(self.gauges.items())},
+			'stages': {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())},
+		}
+
+	def text(self):
+		"""Return the metrics as one line per counter, gauge and stage (times in ms)."""
+		snapshot = self.snapshot()
+		lines = ['%s %s' % item for item in sorted(snapshot['counters'].items())]
+		lines += ['%s %s' % item for item in sorted(snapshot['gauges'].items())]
+		ms = lambda value: '-' if value is None else '%.3f' % (value * 1000)
+		for name, stage in snapshot['stages'].items():
+			lines.append('%s count=%d mean=%s p50=%s p90=%s p99=%s max=%s' % (name, stage['count'],
+				ms(stage['mean']), ms(stage['p50']), ms(stage['p90']), ms(stage['p99']), ms(stage['max'])))
+		return '\n'.join(lines) + '\n'
+
+	def serve(self, port, host='127.0.0.1'):
+		"""Serve the metrics over HTTP on a local port: /metrics.json as JSON, anything else as text."""
+		self.enabled = True
+		try:
+			listener = socket.create_server((host, port))
+		except OSError as e:
+			print("Metrics: cannot listen on %s:%d (%s)" % (host, port, e))
+			return
+		self.server = listener
+		threading.Thread(target=self.serveLoop, args=(listener,), name="Metrics", daemon=True).start()
+
+	def serveLoop(self, listener):
+		while True:
+			try:
+				conn, _ = listener.accept()
+			except OSError:
+				return
+			with conn:
+				conn.settimeout(1.0)
+				try:
+					request = conn.recv(1024)
+				except OSError:
+					# Không có request (vd. nc): trả về dạng text
+					request = b''
+				if b'.json' in request.split(b'\n', 1)[0]:
+					body, contentType = json.dumps(self.snapshot()).encode(), 'application/json'
+				else:
+					body, contentType = self.text().encode(), 'text/plain'
+				try:
+					conn.sendall(b'HTTP/1.0 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n'
+						% (contentType.encode(), len(body)) + body)
+				except OSError:
+					pass
+
+
+metrics = Metrics()
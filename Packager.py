@@ -0,0 +1,181 @@
+"""Convert a video (RAW, CUSTOM or HEADERED MJPEG) into the packed container that
+VideoStream reads without scanning: header, per-frame offset/size/timestamp table,
+optional precomputed RTP fragment boundaries, then the frames.
+
+RAW input is split by walking the JPEG markers, so an FFD9 inside an embedded
+thumbnail or other segment does not end a frame early.
+
+Usage: Packager.py Input_file Output_file [--fps N] [--fragments [Payload_size]]
+"""
+import mmap, os, sys
+from array import array
+
+from VideoStream import (VideoStream, detectFormat, CONTAINER_MAGIC, CONTAINER_VERSION, CONTAINER_HEADER,
+	FLAG_FRAGMENTS, DEFAULT_FRAME_RATE)
+from RtpPacket import MAX_RTP_PAYLOAD
+
+SOI = b'\xFF\xD8'
+EOI = b'\xFF\xD9'
+SOS = 0xDA
+# Marker không có trường độ dài: TEM, RST0-7 (SOI/EOI xử lý riêng)
+STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+
+
+def jpegEnd(data, start):
+	"""Return the offset just past the EOI of the JPEG starting at start, or -1.
+
+	Marker segments are skipped by their length field, and entropy-coded data is
+	scanned for the next real marker (FF00 stuffing and RSTn are not markers).
+	"""
+	size = len(data)
+	if data[start:start + 2] != SOI:
+		return -1
+	i = start + 2
+	while i + 1 < size:
+		if data[i] != 0xFF:
+			# Không đúng cấu trúc: quay về tìm EOI như cách cũ
+			end = data.find(EOI, i)
+			return -1 if end < 0 else end + 2
+		marker = data[i + 1]
+		if marker == 0xFF:
+			# Byte đệm trước marker
+			i += 1
+			continue
+		if marker == 0xD9:
+			return i + 2
+		if marker in STANDALONE:
+			i += 2
+			continue
+		if i + 4 > size:
+			return -1
+		i += 2 + ((data[i + 2] << 8) | data[i + 3])
+		if marker != SOS:
+			continue
+		# Dữ liệu ảnh sau SOS: tìm marker thật tiếp theo
+		while True:
+			i = data.find(b'\xFF', i)
+			if i < 0 or i + 1 >= size:
+				return -1
+			following = data[i + 1]
+			if following == 0x00 or 0xD0 <= following <= 0xD7:
+				i += 2
+			elif following == 0xFF:
+				i += 1
+			else:
+				break
+	return -1
+
+
+def scanJpegFrames(data):
+	"""Split concatenated JPEGs by their structure. Return (offsets, lengths)."""
+	offsets = array('Q')
+	lengths = array('Q')
+	pos = 0
+	while True:
+		start = data.find(SOI, pos)
+		if start < 0:
+			break
+		end = jpegEnd(data, start)
+		if end < 0:
+			print("Warning: incomplete JPEG at offset %d ignored." % start)
+			break
+		offsets.append(start)
+		lengths.append(end - start)
+		pos = end
+	return offsets, lengths
+
+
+def readFrames(filename):
+	"""Return (list of frames, frame rate) for any supported input."""
+	with open(filename, 'rb') as f:
+		format = detectFormat(f, os.fstat(f.fileno()).st_size)
+		if format == "RAW":
+			# Không dùng cách tách theo EOI của VideoStream cho file RAW
+			try:
+				data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				raise IOError
+			offsets, lengths = scanJpegFrames(data)
+			view = memoryview(data)
+			return [view[o:o + n] for o, n in zip(offsets, lengths)], DEFAULT_FRAME_RATE
+	stream = VideoStream(filename)
+	frameRate = stream.frameRate
+	frames = []
+	while True:
+		frame = stream.nextFrame()
+		if not frame:
+			break
+		frames.append(frame)
+	stream.close()
+	return frames, frameRate
+
+
+def writeContainer(filename, frames, frameRate=DEFAULT_FRAME_RATE, payloadSize=0):
+	"""Write frames to a packed container. payloadSize > 0 also stores fragment boundaries."""
+	count = len(frames)
+	flags = FLAG_FRAGMENTS if payloadSize else 0
+	lengths = array('Q', (len(frame) for frame in frames))
+	timestamps = array('Q', (int(i * 1000 / frameRate) for i in range(count)))
+	fragmentStarts = array('Q', [0])
+	fragmentEnds = array('I')
+	if payloadSize:
+		for length in lengths:
+			if length:
+				fragmentEnds.extend(range(payloadSize, length, payloadSize))
+				fragmentEnds.append(length)
+			fragmentStarts.append(len(fragmentEnds))
+
+	tableSize = 3 * count * 8
+	if payloadSize:
+		tableSize += len(fragmentStarts) * 8 + len(fragmentEnds) * 4
+	offsets = array('Q')
+	pos = CONTAINER_HEADER.size + tableSize
+	for length in lengths:
+		offsets.append(pos)
+		pos += length
+
+	tables = [offsets, lengths, timestamps]
+	if payloadSize:
+		tables += [fragmentStarts, fragmentEnds]
+	if sys.byteorder == 'big':
+		for table in tables:
+			table.byteswap()
+
+	tmpFile = filename + '.tmp'
+	with open(tmpFile, 'wb') as out:
+		out.write(CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, flags,
+			int(round(frameRate * 1000)), payloadSize, count, len(fragmentEnds)))
+		for table in tables:
+			out.write(table.tobytes())
+		for frame in frames:
+			out.write(frame)
+	os.replace(tmpFile, filename)
+
+
+def main(argv):
+	try:
+		source, target = argv[1], argv[2]
+		options = argv[3:]
+		frameRate = None
+		if '--fps' in options:
+			frameRate = float(options[options.index('--fps') + 1])
+		payloadSize = 0
+		if '--fragments' in options:
+			at = options.index('--fragments') + 1
+			payloadSize = int(options[at]) if at < len(options) and options[at].isdigit() else MAX_RTP_PAYLOAD
+	except (IndexError, ValueError):
+		print(__doc__)
+		return 1
+
+	try:
+		frames, inputRate = readFrames(source)
+	except IOError:
+		print("Cannot read %s" % source)
+		return 1
+	writeContainer(target, frames, frameRate or inputRate, payloadSize)
+	print("%s: %d frames, %d bytes" % (target, len(frames), os.path.getsize(target)))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv))
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+from RtpPacket import SESSION_FIELDS, MAX_RTP_PAYLOAD
+
+MJPEG_PT = 26
+# Giới hạn số fragment được giữ trong cache của mỗi asset
+MAX_CACHED_FRAGMENTS = 16384
+
+
+def headerTemplate(marker, pt=MJPEG_PT):
+	"""Return a 12-byte RTP header (V=2, P=0, X=0, CC=0) with seqnum/timestamp/SSRC zeroed."""
+	return bytes([2 << 6, (marker << 7) | pt]) + bytes(10)
+
+
+def patchHeader(template, seqnum, timestamp, ssrc):
+	"""Copy a header template and fill in the per-session fields."""
+	header = bytearray(template)
+	SESSION_FIELDS.pack_into(header, 2, seqnum & 0xFFFF, timestamp & 0xFFFFFFFF, ssrc)
+	return header
+
+
+def fragmentFrame(data, payloadSize=MAX_RTP_PAYLOAD, pt=MJPEG_PT, ends=None):
+	"""Split a frame into (header template, payload view) pairs; only the last has M=1.
+
+	ends optionally gives precomputed fragment end offsets (from a packed container).
+	"""
+	middle = headerTemplate(0, pt)
+	last = headerTemplate(1, pt)
+	view = memoryview(data)
+	total = len(view)
+	if ends is None:
+		ends = range(payloadSize, total + payloadSize, payloadSize) if total else ()
+	fragments = []
+	start = 0
+	for end in ends:
+		end = min(end, total)
+		fragments.append((last if end == total else middle, view[start:end]))
+		start = end
+	return tuple(fragments)
+
+
+class PacketCache:
+	"""Bounded LRU of packetized frames for one shared asset."""
+
+	def __init__(self, asset, maxFragments=MAX_CACHED_FRAGMENTS, payloadSize=MAX_RTP_PAYLOAD):
+		self.asset = asset
+		self.maxFragments = maxFragments
+		self.payloadSize = payloadSize
+		self.frames = OrderedDict()
+		self.size = 0
+		self.lock = threading.Lock()
+
+	def fragments(self, frameIndex):
+		"""Return the fragment layout of a frame (0-based), building it on a miss."""
+		fragments = self.cached(frameIndex)
+		if fragments is not None:
+			return fragments
+		# Dựng ngoài khoá: asset.frame() có thể chậm (rendition mã hoá lại JPEG)
+		fragments = fragmentFrame(self.asset.frame(frameIndex), self.payloadSize,
+			ends=self.asset.fragmentEnds(frameIndex, self.payloadSize))
+		with self.lock:
+			existing = self.frames.get(frameIndex)
+			if existing is not None:
+				# Luồng khác vừa dựng xong cùng khung hình: dùng chung bản đã có
+				return existing
+			self.frames[frameIndex] = fragments
+			self.size += len(fragments)
+			while self.size > self.maxFragments and len(self.frames) > 1:
+				_, old = self.frames.popitem(last=False)
+				self.size -= len(old)
+			return fragments
+
+	def cached(self, frameIndex):
+		"""Return the fragment layout of a frame if it is in the cache, else None."""
+		with self.lock:
+			fragments = self.frames.get(frameIndex)
+			if fragments is not None:
+				self.frames.move_to_end(frameIndex)
+			return fragments
+
+	def clear(self):
+		"""Drop every cached frame."""
+		with self.lock:
+			self.frames.clear()
+			self.size = 0
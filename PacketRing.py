@@ -0,0 +1,93 @@
+"""Preallocated buffers for the client receive path.
+
+PacketRing receives datagrams with recv_into() into fixed slots, so a packet
+costs no new bytes object; the jitter buffer hands slots back once their frame
+is assembled or dropped. FrameBuffers assembles frames into a rotating set of
+reusable bytearrays sized from recent frames instead of joining a new bytes
+object per frame.
+"""
+
+# Một slot đủ cho một datagram trên Ethernet (MTU 1500)
+SLOT_SIZE = 2048
+# Số slot: đủ cho các frame HD đang chờ trong jitter buffer (~4 MB)
+RING_SLOTS = 2048
+# Buffer frame lớn hơn đỉnh gần đây một chút để frame sau lớn hơn không phải cấp lại
+FRAME_HEADROOM = 1.25
+# Đỉnh kích thước frame giảm dần theo hệ số này mỗi frame
+PEAK_DECAY = 0.99
+
+
+class PacketRing:
+	"""Fixed pool of receive slots, each a preallocated bytearray."""
+
+	def __init__(self, slots=RING_SLOTS, slotSize=SLOT_SIZE):
+		self.slotSize = slotSize
+		self.views = [memoryview(bytearray(slotSize)) for _ in range(slots)]
+		self.free = list(self.views)
+		# bytearray của slot -> view của cả slot, để nhận lại slot từ một payload
+		self.owner = {id(view.obj): view for view in self.views}
+		self.overflows = 0
+
+	def recv(self, sock):
+		"""Receive one datagram. Return a memoryview of it (valid until recycled)."""
+		if self.free:
+			view = self.free.pop()
+			try:
+				n = sock.recv_into(view)
+			except BaseException:
+				self.free.append(view)
+				raise
+			return view[:n]
+		# Hết slot (frame thiếu gói bị giữ quá lâu): nhận vào buffer mới, không mất gói
+		self.overflows += 1
+		view = memoryview(bytearray(self.slotSize))
+		return view[:sock.recv_into(view)]
+
+	def recycle(self, payloads):
+		"""Give back the slots behind payload views the jitter buffer no longer needs."""
+		owner = self.owner
+		for payload in payloads:
+			view = owner.get(id(payload.obj))
+			if view is not None:
+				self.free.append(view)
+
+	def stats(self):
+		return {'slots': len(self.views), 'free': len(self.free), 'overflows': self.overflows}
+
+
+class FrameBuffers:
+	"""Rotating reusable buffers that frames are assembled into.
+
+	A returned frame is a memoryview that stays valid until count more frames
+	have been assembled, so count must exceed the number of frames the player
+	holds at once.
+	"""
+
+	def __init__(self, count):
+		self.buffers = [bytearray(0) for _ in range(count)]
+		self.views = [memoryview(buffer) for buffer in self.buffers]
+		self.next = 0
+		self.peak = 0
+		self.reallocations = 0
+
+	def assemble(self, parts, total):
+		"""Copy the payloads (total bytes) into the next buffer. Return a memoryview of the frame."""
+		self.peak = max(total, int(self.peak * PEAK_DECAY))
+		i = self.next
+		self.next = (i + 1) % len(self.buffers)
+		buffer = self.buffers[i]
+		# Cấp lại khi quá nhỏ, hoặc quá lớn so với các frame gần đây (vd. sau khi đổi rendition)
+		if len(buffer) < total or len(buffer) > 4 * FRAME_HEADROOM * self.peak:
+			# Frame cũ có thể vẫn giữ view của buffer cũ: thay buffer mới thay vì resize
+			buffer = self.buffers[i] = bytearray(int(self.peak * FRAME_HEADROOM))
+			self.views[i] = memoryview(buffer)
+			self.reallocations += 1
+		pos = 0
+		for part in parts:
+			end = pos + len(part)
+			buffer[pos:end] = part
+			pos = end
+		return self.views[i][:total]
+
+	def stats(self):
+		return {'buffers': len(self.buffers), 'peak': self.peak, 'reallocations': self.reallocations}
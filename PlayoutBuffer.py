@@ -0,0 +1,125 @@
+import threading
+from collections import deque
+from time import monotonic
+
+
+class PlayoutBuffer:
+	"""Blocking frame queue that schedules playout from RTP timestamps.
+
+	Each frame is due at timestamp / clockRate + base, where base is fixed by the
+	first frame plus the target latency. The target latency grows when frames
+	arrive after their due time and shrinks again when every recent frame had
+	plenty of slack, between minLatency and maxLatency.
+	"""
+
+	def __init__(self, clockRate, maxFrames=10, targetLatency=0.1, minLatency=0.02,
+			maxLatency=1.0, step=0.02, window=50):
+		self.clockRate = clockRate
+		self.maxFrames = maxFrames
+		self.targetLatency = targetLatency
+		self.minLatency = minLatency
+		self.maxLatency = maxLatency
+		self.step = step
+		self.window = window
+		self.frames = deque()
+		self.cond = threading.Condition()
+		self.base = None
+		self.lastTimestamp = None
+		self.mediaTime = 0.0 # thời gian media (s) của frame cuối, đã xử lý timestamp bị quay vòng
+		self.minSlack = None
+		self.slackCount = 0
+		self.closed = False
+		# Bộ đếm
+		self.framesIn = 0
+		self.framesDropped = 0
+		self.framesLate = 0
+		self.framesSkipped = 0
+		self.newestDue = None
+
+	def put(self, timestamp, frame, arrival=None):
+		"""Add a frame released by the jitter buffer and wake the consumer."""
+		if arrival is None:
+			arrival = monotonic()
+		with self.cond:
+			if self.lastTimestamp is not None:
+				delta = (timestamp - self.lastTimestamp) & 0xFFFFFFFF
+				if delta >= 0x80000000:
+					delta -= 0x100000000
+				self.mediaTime += delta / self.clockRate
+			self.lastTimestamp = timestamp
+			if self.base is None:
+				self.base = arrival + self.targetLatency - self.mediaTime
+
+			due = self.mediaTime + self.base
+			slack = due - arrival
+			if slack < -self.maxLatency:
+				# Nhảy thời gian (PAUSE/PLAY, server khởi động lại): đặt lại mốc
+				self.base = arrival + self.targetLatency - self.mediaTime
+				due = arrival + self.targetLatency
+			elif slack < 0:
+				# Frame đến sau thời điểm phát: tăng độ trễ mục tiêu
+				self.framesLate += 1
+				self.adjust(min(self.maxLatency, self.targetLatency + self.step))
+				due = self.mediaTime + self.base
+			else:
+				self.trackSlack(slack)
+
+			if len(self.frames) >= self.maxFrames:
+				self.frames.popleft()
+				self.framesDropped += 1
+			self.frames.append((due, timestamp, frame, arrival))
+			self.newestDue = due
+			self.framesIn += 1
+			self.cond.notify()
+
+	def trackSlack(self, slack):
+		"""Lower the latency when every frame in the last window arrived well ahead of time."""
+		self.minSlack = slack if self.minSlack is None else min(self.minSlack, slack)
+		self.slackCount += 1
+		if self.slackCount >= self.window:
+			if self.minSlack > 2 * self.step:
+				self.adjust(max(self.minLatency, self.targetLatency - self.step))
+			self.minSlack = None
+			self.slackCount = 0
+
+	def adjust(self, latency):
+		self.base += latency - self.targetLatency
+		self.targetLatency = latency
+
+	def get(self, timeout=None, skipBacklog=None):
+		"""Wait for the next frame. Return (due time, timestamp, frame, arrival), or None on timeout/close.
+
+		With skipBacklog, if more than that many frames are waiting, all but the newest
+		are discarded (and counted as skipped) and the newest is returned.
+		"""
+		with self.cond:
+			if not self.frames and not self.closed:
+				self.cond.wait(timeout)
+			if not self.frames:
+				return None
+			if skipBacklog is not None and len(self.frames) > skipBacklog:
+				self.framesSkipped += len(self.frames) - 1
+				item = self.frames[-1]
+				self.frames.clear()
+				return item
+			return self.frames.popleft()
+
+	def close(self):
+		"""Wake up any waiting consumer."""
+		with self.cond:
+			self.closed = True
+			self.cond.notify_all()
+
+	def __len__(self):
+		return len(self.frames)
+
+	def stats(self):
+		"""Return the playout counters as a dict."""
+		return {
+			'framesIn': self.framesIn,
+			'framesDropped': self.framesDropped,
+			'framesLate': self.framesLate,
+			'framesSkipped': self.framesSkipped,
+			'buffered': len(self.frames),
+			'targetLatency': self.targetLatency,
+		}
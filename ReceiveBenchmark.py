@@ -0,0 +1,107 @@
+"""Benchmark of the client receive path over loopback UDP.
+
+Compares the old path (recv() into a new bytes object, an RtpPacket per packet,
+frames joined into new bytes) with recv_into() into PacketRing slots and frames
+assembled into reusable FrameBuffers. Reports packets per second and garbage
+collections per 10k packets, for the video's own frames and for frames grown to
+HD size (about 150 KB, 100+ packets).
+
+Usage: ReceiveBenchmark.py [Video_file] [Frames]
+"""
+import gc, socket, sys
+from time import perf_counter
+
+from VideoStream import VideoStream
+from RtpPacket import RtpPacket, encodeFrame, HEADER, HEADER_SIZE
+from JitterBuffer import JitterBuffer
+from PacketRing import PacketRing, FrameBuffers
+
+# Gửi từng đợt nhỏ hơn buffer nhận của socket để không mất gói trên loopback
+BATCH = 256
+# Kích thước frame (byte) của lượt đo HD
+HD_FRAME = 150000
+
+
+def legacyReceive(sock, count, jitterBuffer):
+	frames = 0
+	for _ in range(count):
+		data = sock.recv(20480)
+		packet = RtpPacket()
+		packet.decode(data)
+		marker, pt, seq, timestamp, ssrc = packet.fields()
+		frames += len(jitterBuffer.push(seq, timestamp, marker, packet.getPayload()))
+	return frames
+
+
+def ringReceive(sock, count, jitterBuffer, ring):
+	frames = 0
+	receive = ring.recv
+	push = jitterBuffer.push
+	unpack = HEADER.unpack_from
+	for _ in range(count):
+		data = receive(sock)
+		_, mpt, seq, timestamp, ssrc = unpack(data)
+		frames += len(push(seq, timestamp, mpt >> 7, data[HEADER_SIZE:]))
+	return frames
+
+
+def run(label, packets, receive):
+	receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+	receiver.bind(('127.0.0.1', 0))
+	sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sender.connect(receiver.getsockname())
+
+	elapsed = 0.0
+	frames = 0
+	collections = sum(stat['collections'] for stat in gc.get_stats())
+	for start in range(0, len(packets), BATCH):
+		batch = packets[start:start + BATCH]
+		for packet in batch:
+			sender.send(packet)
+		begin = perf_counter()
+		frames += receive(receiver, len(batch))
+		elapsed += perf_counter() - begin
+	collections = sum(stat['collections'] for stat in gc.get_stats()) - collections
+	sender.close()
+	receiver.close()
+	print(f"{label:<16}{len(packets) / elapsed:>14,.0f} packets/s  {frames} frames  "
+		f"{collections * 10000 / len(packets):.2f} GC/10k packets")
+
+
+def packetize(frames, count):
+	packets = []
+	seqnum = 0
+	for i in range(count):
+		framePackets, seqnum = encodeFrame(frames[i % len(frames)], seqnum, i, 1)
+		packets.extend(bytes(packet) for packet in framePackets)
+	return packets
+
+
+if __name__ == "__main__":
+	filename = sys.argv[1] if len(sys.argv) > 1 else "sample_640x360.mjpeg"
+	maxFrames = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+	stream = VideoStream(filename)
+	frames = []
+	while True:
+		data = stream.nextFrame()
+		if not data:
+			break
+		frames.append(bytes(data))
+	# Frame "HD": nối các frame liên tiếp (vẫn bắt đầu bằng SOI) tới khoảng HD_FRAME byte
+	hdFrames = []
+	for i in range(len(frames)):
+		frame = b''
+		while len(frame) < HD_FRAME:
+			frame += frames[(i + len(hdFrames)) % len(frames)]
+		hdFrames.append(frame)
+
+	for label, packets in (("source frames", packetize(frames, maxFrames)), ("HD frames", packetize(hdFrames, maxFrames // 10))):
+		print(f"{label}: {len(packets)} packets")
+		jitterBuffer = JitterBuffer(reorderWindow=64)
+		run("recv + join", packets, lambda sock, count: legacyReceive(sock, count, jitterBuffer))
+		ring = PacketRing()
+		jitterBuffer = JitterBuffer(reorderWindow=64, frameBuffers=FrameBuffers(4), recycle=ring.recycle)
+		run("recv_into ring", packets, lambda sock, count: ringReceive(sock, count, jitterBuffer, ring))
+		print(" ", ring.stats(), jitterBuffer.frameBuffers.stats())
@@ -0,0 +1,225 @@
+"""Lower-quality renditions of a video for adaptive bitrate.
+
+Renditions are either generated offline next to the video (Renditions.py Video_file)
+or, if Pillow is installed, re-encoded on first use and kept in the packet cache.
+Re-encoding runs on a background thread, never on the thread that paces the
+sessions; a stream keeps its current level until the lower one's frames are ready.
+
+Usage: Renditions.py Video_file
+"""
+import io, os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from PacketCache import PacketCache
+from VideoStream import VideoStream
+
+try:
+	from PIL import Image
+except ImportError:
+	# Không có Pillow: chỉ dùng được các rendition đã tạo sẵn
+	Image = None
+
+# (tên, tỉ lệ kích thước, chất lượng JPEG); mức 0 là file gốc
+RENDITIONS = (
+	('medium', 0.75, 70),
+	('low', 0.5, 50),
+)
+
+# Số khung hình được mã hoá trước, tính từ khung hình đang cần gửi
+ENCODE_AHEAD = 20
+
+# Ngưỡng của bộ điều khiển: mất gói / jitter (s) trong báo cáo RTCP
+LOSS_DOWN = 0.05
+LOSS_UP = 0.01
+JITTER_DOWN = 0.1
+# Chờ ít nhất khoảng này (s) sau khi đổi mức trước khi giảm tiếp (để có RR mới)
+HOLD_DOWN = 2.0
+# Phải tốt liên tục trong khoảng này (s) mới tăng chất lượng
+HOLD_UP = 5.0
+
+
+def renditionFile(filename, name):
+	"""Path of a pre-generated rendition: movie.mjpeg -> movie.low.mjpeg."""
+	base, ext = os.path.splitext(filename)
+	return base + '.' + name + ext
+
+
+def encodeFrame(data, scale, quality):
+	"""Re-encode one JPEG frame at a smaller size and quality."""
+	image = Image.open(io.BytesIO(data))
+	width, height = image.size
+	size = (max(1, int(width * scale)), max(1, int(height * scale)))
+	# Giải mã JPEG ở độ phân giải thấp hơn khi có thể, rồi mới thu nhỏ
+	image.draft('RGB', size)
+	image = image.convert('RGB').resize(size, Image.BILINEAR)
+	out = io.BytesIO()
+	image.save(out, 'JPEG', quality=quality)
+	return out.getvalue()
+
+
+# Một luồng mã hoá chung cho mọi rendition, tạo khi cần lần đầu
+encoder = None
+encoderLock = threading.Lock()
+
+
+def encoderPool():
+	global encoder
+	with encoderLock:
+		if encoder is None:
+			encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="RenditionEncoder")
+		return encoder
+
+
+class LazyRendition:
+	"""Rendition encoded from the original frames on a background thread, on first request."""
+
+	def __init__(self, asset, scale, quality):
+		self.asset = asset
+		self.scale = scale
+		self.quality = quality
+		# Cache fragment theo khung hình cũng giữ các JPEG đã mã hoá lại
+		self.packets = PacketCache(self)
+		self.pending = set() # khung hình đang chờ hoặc đang được mã hoá
+		self.lock = threading.Lock()
+		self.closed = False
+
+	def frameCount(self):
+		return self.asset.frameCount()
+
+	def frame(self, frameIndex):
+		return encodeFrame(bytes(self.asset.frame(frameIndex)), self.scale, self.quality)
+
+	def fragmentEnds(self, frameIndex, payloadSize):
+		return None
+
+	def ready(self, frameIndex):
+		"""Return the fragments of a frame if already encoded, else None.
+
+		Either way the frames from frameIndex to ENCODE_AHEAD after it are queued for encoding.
+		"""
+		fragments = self.packets.cached(frameIndex)
+		end = min(frameIndex + ENCODE_AHEAD, self.frameCount())
+		with self.lock:
+			if self.closed:
+				return fragments
+			todo = [i for i in range(frameIndex, end) if i not in self.pending and self.packets.cached(i) is None]
+			self.pending.update(todo)
+		if todo:
+			pool = encoderPool()
+			for i in todo:
+				pool.submit(self.encode, i)
+		return fragments
+
+	def encode(self, frameIndex):
+		try:
+			if not self.closed:
+				self.packets.fragments(frameIndex)
+		except Exception as e:
+			# Frame hỏng hoặc asset đã đóng: stream tiếp tục gửi mức tốt hơn
+			print("Renditions: cannot encode frame %d (%s)" % (frameIndex, e))
+		finally:
+			with self.lock:
+				self.pending.discard(frameIndex)
+
+	def close(self):
+		with self.lock:
+			self.closed = True
+		self.packets.clear()
+
+
+def loadRenditions(asset, assetType):
+	"""Return the renditions of an asset, best first; index 0 is the asset itself.
+
+	A pre-generated file is used when its frame count matches the original
+	(timestamps are frame numbers); otherwise the frame is re-encoded lazily if
+	Pillow is available.
+	"""
+	renditions = [asset]
+	for name, scale, quality in RENDITIONS:
+		path = renditionFile(asset.filename, name)
+		if os.path.exists(path):
+			try:
+				rendition = assetType(path)
+			except (OSError, ValueError):
+				rendition = None
+			if rendition is not None and rendition.frameCount() == asset.frameCount():
+				renditions.append(rendition)
+				continue
+			if rendition is not None:
+				print("Renditions: %s has a different frame count, ignored" % path)
+				rendition.close()
+		if Image is not None:
+			renditions.append(LazyRendition(asset, scale, quality))
+	return renditions
+
+
+class RenditionController:
+	"""Per-session choice of rendition from RTCP receiver reports.
+
+	Steps down one level when a report shows loss above LOSS_DOWN or jitter above
+	JITTER_DOWN, and back up after HOLD_UP seconds of clean reports. The new level
+	takes effect at the next frame.
+	"""
+
+	def __init__(self, levels):
+		self.levels = levels
+		self.level = 0
+		self.reportsSeen = 0
+		self.lastSwitch = None
+		self.goodSince = None
+		self.switches = 0
+
+	def update(self, stats, now=None):
+		"""Look at the latest receiver report. Return the rendition level to send."""
+		if self.levels <= 1 or stats.reportsReceived == self.reportsSeen:
+			return self.level
+		self.reportsSeen = stats.reportsReceived
+		if now is None:
+			now = monotonic()
+		settled = self.lastSwitch is None or now - self.lastSwitch >= HOLD_DOWN
+		if stats.fractionLost > LOSS_DOWN or stats.jitter > JITTER_DOWN:
+			self.goodSince = None
+			if settled and self.level < self.levels - 1:
+				self.switch(self.level + 1, now)
+		elif stats.fractionLost <= LOSS_UP:
+			if self.goodSince is None:
+				self.goodSince = now
+			elif now - self.goodSince >= HOLD_UP and self.level > 0:
+				self.switch(self.level - 1, now)
+				self.goodSince = now
+		return self.level
+
+	def switch(self, level, now):
+		self.level = level
+		self.lastSwitch = now
+		self.switches += 1
+
+
+def generate(filename):
+	"""Write every rendition of a video next to it, as concatenated JPEGs."""
+	if Image is None:
+		print("Pillow is required to generate renditions")
+		return 1
+	for name, scale, quality in RENDITIONS:
+		path = renditionFile(filename, name)
+		stream = VideoStream(filename)
+		count = 0
+		with open(path + '.tmp', 'wb') as out:
+			while True:
+				data = stream.nextFrame()
+				if not data:
+					break
+				out.write(encodeFrame(bytes(data), scale, quality))
+				count += 1
+		stream.close()
+		os.replace(path + '.tmp', path)
+		print("%s: %d frames" % (path, count))
+	return 0
+
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print(__doc__)
+		sys.exit(1)
+	sys.exit(generate(sys.argv[1]))
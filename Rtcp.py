@@ -0,0 +1,237 @@
+import struct
+from time import time, monotonic
+
+# RTCP packet types (RFC 3550)
+SR = 200
+RR = 201
+
+# Khoảng thời gian (s) giữa hai báo cáo RTCP của một session
+RTCP_INTERVAL = 1.0
+
+# Giây từ 1900 (NTP) đến 1970 (Unix)
+NTP_EPOCH = 2208988800
+
+# V=2, P, RC, PT, length (số từ 32 bit - 1)
+RTCP_HEADER = struct.Struct('!BBH')
+# SSRC người gửi, NTP (msw, lsw), RTP timestamp, số gói, số byte
+SENDER_INFO = struct.Struct('!IIIIII')
+# SSRC nguồn, fraction lost + cumulative lost (24 bit), extended highest seq, jitter, LSR, DLSR
+REPORT_BLOCK = struct.Struct('!IIIIII')
+
+
+def ntpTime(now=None):
+	"""Current wall-clock time as a 64-bit NTP timestamp (msw, lsw)."""
+	if now is None:
+		now = time()
+	seconds = int(now)
+	return (seconds + NTP_EPOCH) & 0xFFFFFFFF, int((now - seconds) * (1 << 32)) & 0xFFFFFFFF
+
+
+def ntpMiddle(msw, lsw):
+	"""Middle 32 bits of an NTP timestamp (the LSR/DLSR time base, 1/65536 s units)."""
+	return ((msw & 0xFFFF) << 16) | (lsw >> 16)
+
+
+class ReportBlock:
+	__slots__ = ('ssrc', 'fractionLost', 'cumulativeLost', 'highestSeq', 'jitter', 'lsr', 'dlsr')
+
+	def __init__(self, ssrc, fractionLost, cumulativeLost, highestSeq, jitter, lsr, dlsr):
+		self.ssrc = ssrc
+		self.fractionLost = fractionLost # 0..255, phần mất tính theo 1/256
+		self.cumulativeLost = cumulativeLost
+		self.highestSeq = highestSeq
+		self.jitter = jitter # đơn vị RTP timestamp
+		self.lsr = lsr
+		self.dlsr = dlsr
+
+	def encode(self):
+		lost = max(-0x800000, min(0x7FFFFF, self.cumulativeLost)) & 0xFFFFFF
+		return REPORT_BLOCK.pack(self.ssrc, (self.fractionLost << 24) | lost,
+			self.highestSeq & 0xFFFFFFFF, self.jitter & 0xFFFFFFFF, self.lsr, self.dlsr)
+
+	@classmethod
+	def decode(cls, data, offset):
+		ssrc, lost, highestSeq, jitter, lsr, dlsr = REPORT_BLOCK.unpack_from(data, offset)
+		cumulative = lost & 0xFFFFFF
+		if cumulative & 0x800000:
+			cumulative -= 0x1000000
+		return cls(ssrc, lost >> 24, cumulative, highestSeq, jitter, lsr, dlsr)
+
+
+class RtcpReport:
+	"""One decoded SR or RR."""
+	__slots__ = ('type', 'ssrc', 'ntp', 'rtpTimestamp', 'packetCount', 'octetCount', 'blocks')
+
+	def __init__(self, type, ssrc, blocks, ntp=None, rtpTimestamp=0, packetCount=0, octetCount=0):
+		self.type = type
+		self.ssrc = ssrc
+		self.blocks = blocks
+		self.ntp = ntp
+		self.rtpTimestamp = rtpTimestamp
+		self.packetCount = packetCount
+		self.octetCount = octetCount
+
+
+def senderReport(ssrc, rtpTimestamp, packetCount, octetCount, blocks=(), now=None):
+	"""Build an SR packet."""
+	msw, lsw = ntpTime(now)
+	body = SENDER_INFO.pack(ssrc, msw, lsw, rtpTimestamp & 0xFFFFFFFF,
+		packetCount & 0xFFFFFFFF, octetCount & 0xFFFFFFFF)
+	body += b''.join(block.encode() for block in blocks)
+	return RTCP_HEADER.pack(0x80 | len(blocks), SR, len(body) // 4) + body
+
+
+def receiverReport(ssrc, blocks):
+	"""Build an RR packet."""
+	body = struct.pack('!I', ssrc) + b''.join(block.encode() for block in blocks)
+	return RTCP_HEADER.pack(0x80 | len(blocks), RR, len(body) // 4) + body
+
+
+def decode(data):
+	"""Decode a (compound) RTCP datagram. Unknown or malformed packets are skipped."""
+	reports = []
+	offset = 0
+	while offset + RTCP_HEADER.size <= len(data):
+		first, pt, length = RTCP_HEADER.unpack_from(data, offset)
+		end = offset + (length + 1) * 4
+		if first >> 6 != 2 or end > len(data):
+			break
+		count = first & 0x1F
+		if pt == SR and length >= 6:
+			ssrc, msw, lsw, rtpTimestamp, packets, octets = SENDER_INFO.unpack_from(data, offset + 4)
+			blocksAt = offset + 4 + SENDER_INFO.size
+			report = RtcpReport(SR, ssrc, [], (msw, lsw), rtpTimestamp, packets, octets)
+		elif pt == RR and length >= 1:
+			ssrc, = struct.unpack_from('!I', data, offset + 4)
+			blocksAt = offset + 8
+			report = RtcpReport(RR, ssrc, [])
+		else:
+			offset = end
+			continue
+		for i in range(count):
+			at = blocksAt + i * REPORT_BLOCK.size
+			if at + REPORT_BLOCK.size > end:
+				break
+			report.blocks.append(ReportBlock.decode(data, at))
+		reports.append(report)
+		offset = end
+	return reports
+
+
+class SenderStats:
+	"""Server-side counters of one RTP session, updated from receiver reports."""
+
+	def __init__(self, ssrc, clockRate):
+		self.ssrc = ssrc
+		self.clockRate = clockRate
+		self.packetsSent = 0
+		self.octetsSent = 0
+		self.lastTimestamp = 0
+		self.reportsSent = 0
+		self.reportsReceived = 0
+		self.lastReport = None # monotonic() lúc nhận RR gần nhất
+		self.fractionLost = 0.0
+		self.cumulativeLost = 0
+		self.highestSeq = 0
+		self.jitter = 0.0 # giây
+		self.rtt = None # giây
+
+	def onSent(self, packets):
+		"""Count (header, payload) pairs just sent."""
+		if not packets:
+			return
+		self.packetsSent += len(packets)
+		self.octetsSent += sum(len(payload) for _, payload in packets)
+		self.lastTimestamp = int.from_bytes(packets[-1][0][4:8], 'big')
+
+	def senderReport(self):
+		self.reportsSent += 1
+		return senderReport(self.ssrc, self.lastTimestamp, self.packetsSent, self.octetsSent)
+
+	def onRtcp(self, data):
+		"""Take in receiver reports about this session's SSRC."""
+		for report in decode(data):
+			for block in report.blocks:
+				if block.ssrc != self.ssrc:
+					continue
+				self.reportsReceived += 1
+				self.lastReport = monotonic()
+				self.fractionLost = block.fractionLost / 256
+				self.cumulativeLost = block.cumulativeLost
+				self.highestSeq = block.highestSeq
+				self.jitter = block.jitter / self.clockRate
+				if block.lsr:
+					# RTT = bây giờ - LSR - DLSR (đơn vị 1/65536 s)
+					rtt = (ntpMiddle(*ntpTime()) - block.lsr - block.dlsr) & 0xFFFFFFFF
+					self.rtt = rtt / 65536 if rtt < 0x80000000 else 0.0
+
+	def stats(self):
+		"""Return the counters as a dict."""
+		return {
+			'ssrc': self.ssrc,
+			'packetsSent': self.packetsSent,
+			'octetsSent': self.octetsSent,
+			'reportsSent': self.reportsSent,
+			'reportsReceived': self.reportsReceived,
+			'fractionLost': self.fractionLost,
+			'cumulativeLost': self.cumulativeLost,
+			'highestSeq': self.highestSeq,
+			'jitter': self.jitter,
+			'rtt': self.rtt,
+			'reportAge': None if self.lastReport is None else monotonic() - self.lastReport,
+		}
+
+
+class ReceiverStats:
+	"""Client-side RR builder on top of a JitterBuffer's counters."""
+
+	def __init__(self, ssrc):
+		self.ssrc = ssrc
+		self.sourceSsrc = None
+		self.lastSr = 0 # 32 bit giữa của NTP trong SR gần nhất
+		self.lastSrArrival = None
+		self.expectedPrior = 0
+		self.receivedPrior = 0
+		self.reportsSent = 0
+		self.reportsReceived = 0
+		self.fractionLost = 0.0
+
+	def onRtcp(self, data):
+		"""Remember the last SR so the next RR can carry LSR/DLSR."""
+		for report in decode(data):
+			if report.type == SR:
+				self.reportsReceived += 1
+				self.sourceSsrc = report.ssrc
+				self.lastSr = ntpMiddle(*report.ntp)
+				self.lastSrArrival = monotonic()
+
+	def receiverReport(self, jitterBuffer):
+		"""Build an RR from the jitter buffer counters. Return None before the first SR."""
+		if self.sourceSsrc is None or jitterBuffer is None or jitterBuffer.highestSeq is None:
+			return None
+		expected = jitterBuffer.highestSeq - jitterBuffer.baseSeq + 1
+		received = jitterBuffer.received
+		# Buffer mới (PLAY lại) thì bắt đầu đếm lại
+		if expected < self.expectedPrior or received < self.receivedPrior:
+			self.expectedPrior = self.receivedPrior = 0
+		expectedInterval = expected - self.expectedPrior
+		lostInterval = expectedInterval - (received - self.receivedPrior)
+		self.expectedPrior, self.receivedPrior = expected, received
+		fraction = 0
+		if expectedInterval > 0 and lostInterval > 0:
+			fraction = min(255, (lostInterval << 8) // expectedInterval)
+		self.fractionLost = fraction / 256
+		dlsr = 0
+		if self.lastSrArrival is not None:
+			dlsr = int((monotonic() - self.lastSrArrival) * 65536)
+		block = ReportBlock(self.sourceSsrc, fraction, jitterBuffer.lost(), jitterBuffer.highestSeq,
+			int(jitterBuffer.jitter * jitterBuffer.clockRate), self.lastSr, dlsr)
+		self.reportsSent += 1
+		return receiverReport(self.ssrc, [block])
+
+	def stats(self):
+		return {
+			'reportsSent': self.reportsSent,
+			'reportsReceived': self.reportsReceived,
+			'fractionLost': self.fractionLost,
+		}
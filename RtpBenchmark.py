@@ -0,0 +1,153 @@
+"""Microbenchmark for RtpPacket: packets per second, old codec vs struct-based codec,
+and frames per second for per-packet sendto vs RtpSender over loopback.
+
+Usage: RtpBenchmark.py [Video_file] [Frames]
+"""
+import sys, socket
+from time import perf_counter
+
+from RtpPacket import RtpPacket, HEADER_SIZE, MAX_RTP_PAYLOAD, encodeFrame, decodeMany
+from VideoStream import VideoStream
+from PacketCache import fragmentFrame, patchHeader
+from RtpSender import RtpSender
+
+
+class LegacyRtpPacket:
+	"""The original shift-and-mask codec, kept here as the baseline."""
+
+	def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload, timestamp):
+		header = bytearray(HEADER_SIZE)
+		header[0] = (version << 6) | (padding << 5) | (extension << 4) | cc
+		header[1] = (marker << 7) | pt
+		header[2] = (seqnum >> 8) & 0xFF
+		header[3] = seqnum & 0xFF
+		header[4] = (timestamp >> 24) & 0xFF
+		header[5] = (timestamp >> 16) & 0xFF
+		header[6] = (timestamp >> 8) & 0xFF
+		header[7] = timestamp & 0xFF
+		header[8] = (ssrc >> 24) & 0xFF
+		header[9] = (ssrc >> 16) & 0xFF
+		header[10] = (ssrc >> 8) & 0xFF
+		header[11] = ssrc & 0xFF
+		self.header = header
+		self.payload = payload
+
+	def decode(self, byteStream):
+		self.header = bytearray(byteStream[:HEADER_SIZE])
+		self.payload = byteStream[HEADER_SIZE:]
+
+	def marker(self):
+		return int(self.header[1] >> 7)
+
+	def seqNum(self):
+		return int(self.header[2] << 8 | self.header[3])
+
+	def timestamp(self):
+		return int(self.header[4] << 24 | self.header[5] << 16 | self.header[6] << 8 | self.header[7])
+
+	def getPacket(self):
+		return self.header + self.payload
+
+
+def legacyEncode(frames):
+	packets = []
+	seqnum = 0
+	for timestamp, data in enumerate(frames):
+		total = len(data)
+		for start in range(0, total, MAX_RTP_PAYLOAD):
+			end = min(start + MAX_RTP_PAYLOAD, total)
+			seqnum += 1
+			packet = LegacyRtpPacket()
+			packet.encode(2, 0, 0, 0, seqnum, int(end == total), 26, 0, data[start:end], timestamp)
+			packets.append(packet.getPacket())
+	return packets
+
+
+def structEncode(frames):
+	packets = []
+	seqnum = 0
+	for timestamp, data in enumerate(frames):
+		framePackets, seqnum = encodeFrame(data, seqnum, timestamp, 0)
+		packets.extend(framePackets)
+	return packets
+
+
+def legacyDecode(datagrams):
+	for data in datagrams:
+		packet = LegacyRtpPacket()
+		packet.decode(data)
+		packet.seqNum(), packet.timestamp(), packet.marker()
+
+
+def structDecode(datagrams):
+	for packet in decodeMany(datagrams):
+		packet.fields()
+
+
+def sendtoFrames(frameFragments, sock, address):
+	seqnum = 0
+	for timestamp, fragments in enumerate(frameFragments):
+		for template, payload in fragments:
+			seqnum += 1
+			sock.sendto(patchHeader(template, seqnum, timestamp, 0) + payload, address)
+
+
+def senderFrames(frameFragments, sender):
+	seqnum = 0
+	for timestamp, fragments in enumerate(frameFragments):
+		packets = []
+		for template, payload in fragments:
+			seqnum += 1
+			packets.append((patchHeader(template, seqnum, timestamp, 0), payload))
+		sender.sendFrame(packets)
+
+
+def measure(label, func, args, count, unit="packets/s", rounds=5):
+	best = None
+	for _ in range(rounds):
+		start = perf_counter()
+		func(*args)
+		elapsed = perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	print(f"{label:<16}{count / best:>14,.0f} {unit}")
+	return count / best
+
+
+if __name__ == "__main__":
+	filename = sys.argv[1] if len(sys.argv) > 1 else "sample_640x360.mjpeg"
+	maxFrames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+	stream = VideoStream(filename)
+	frames = []
+	while len(frames) < maxFrames:
+		data = stream.nextFrame()
+		if not data:
+			break
+		frames.append(data)
+
+	packets = legacyEncode(frames)
+	if [bytes(p) for p in structEncode(frames)] != [bytes(p) for p in packets]:
+		print("ERROR: codecs disagree")
+		sys.exit(1)
+	count = len(packets)
+	print(f"{len(frames)} frames, {count} packets\n")
+
+	before = measure("encode legacy", legacyEncode, (frames,), count)
+	after = measure("encode struct", structEncode, (frames,), count)
+	print(f"{'':<16}{after / before:>13.2f}x\n")
+
+	datagrams = [bytes(p) for p in packets]
+	before = measure("decode legacy", legacyDecode, (datagrams,), count)
+	after = measure("decode struct", structDecode, (datagrams,), count)
+	print(f"{'':<16}{after / before:>13.2f}x\n")
+
+	# Gửi tới một socket trên loopback không ai đọc (gói bị bỏ khi đầy buffer)
+	sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sink.bind(('127.0.0.1', 0))
+	address = sink.getsockname()
+	frameFragments = [fragmentFrame(data) for data in frames]
+	plain = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sender = RtpSender(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), address)
+	before = measure("send sendto", sendtoFrames, (frameFragments, plain, address), len(frames), "frames/s")
+	after = measure("send RtpSender", senderFrames, (frameFragments, sender), len(frames), "frames/s")
+	print(f"{'':<16}{after / before:>13.2f}x")
@@ -1,65 +1,105 @@
-import sys
+import sys, struct
 from time import time
 HEADER_SIZE = 12
 
-class RtpPacket:	
-	header = bytearray(HEADER_SIZE)
-	
+# V/P/X/CC, M/PT, seqnum, timestamp, SSRC
+HEADER = struct.Struct('!BBHII')
+# seqnum, timestamp, SSRC (bắt đầu từ byte 2 của header)
+SESSION_FIELDS = struct.Struct('!HII')
+
+MAX_RTP_PAYLOAD = 1400
+
+class RtpPacket:
+	__slots__ = ('header', 'payload')
+
 	def __init__(self):
-		pass
-		
+		self.header = bytearray(HEADER_SIZE)
+		self.payload = b''
+
 	def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload, timestamp):
 		"""Encode the RTP packet with header fields and payload."""
 		header = bytearray(HEADER_SIZE)
-		
-		header[0] = (version << 6) | (padding << 5) | (extension << 4) | cc
-		header[1] = (marker << 7) | pt
-		header[2] = (seqnum >> 8) & 0xFF
-		header[3] = seqnum & 0xFF
-		header[4] = (timestamp >> 24) & 0xFF
-		header[5] = (timestamp >> 16) & 0xFF
-		header[6] = (timestamp >> 8) & 0xFF
-		header[7] = timestamp & 0xFF
-		header[8] = (ssrc >> 24) & 0xFF
-		header[9] = (ssrc >> 16) & 0xFF
-		header[10] = (ssrc >> 8) & 0xFF
-		header[11] = ssrc & 0xFF
-		
+		HEADER.pack_into(header, 0,
+			(version << 6) | (padding << 5) | (extension << 4) | cc,
+			(marker << 7) | pt,
+			seqnum & 0xFFFF, timestamp & 0xFFFFFFFF, ssrc & 0xFFFFFFFF)
+
 		self.header = header
 		self.payload = payload
-		
+
 	def decode(self, byteStream):
-		"""Decode the RTP packet."""
-		self.header = bytearray(byteStream[:HEADER_SIZE])
-		self.payload = byteStream[HEADER_SIZE:]
-	
+		"""Decode the RTP packet without copying: header and payload are views of byteStream."""
+		view = memoryview(byteStream)
+		self.header = view[:HEADER_SIZE]
+		self.payload = view[HEADER_SIZE:]
+
 	def version(self):
 		"""Return RTP version."""
-		return int(self.header[0] >> 6)
-	
+		return self.header[0] >> 6
+
 	def marker(self):
 		"""Return marker bit."""
-		return int(self.header[1] >> 7)
+		return self.header[1] >> 7
 
 	def seqNum(self):
 		"""Return sequence (frame) number."""
-		seqNum = self.header[2] << 8 | self.header[3]
-		return int(seqNum)
-	
+		return self.header[2] << 8 | self.header[3]
+
 	def timestamp(self):
 		"""Return timestamp."""
-		timestamp = self.header[4] << 24 | self.header[5] << 16 | self.header[6] << 8 | self.header[7]
-		return int(timestamp)
-	
+		return SESSION_FIELDS.unpack_from(self.header, 2)[1]
+
+	def ssrc(self):
+		"""Return SSRC."""
+		return SESSION_FIELDS.unpack_from(self.header, 2)[2]
+
 	def payloadType(self):
 		"""Return payload type."""
-		pt = self.header[1] & 127
-		return int(pt)
-	
+		return self.header[1] & 127
+
+	def fields(self):
+		"""Return (marker, payload type, seqnum, timestamp, ssrc) in one unpack."""
+		_, mpt, seqnum, timestamp, ssrc = HEADER.unpack_from(self.header)
+		return mpt >> 7, mpt & 127, seqnum, timestamp, ssrc
+
 	def getPayload(self):
 		"""Return payload."""
 		return self.payload
-		
+
+	def getBuffers(self):
+		"""Return (header, payload) for scatter-gather sends."""
+		return self.header, self.payload
+
 	def getPacket(self):
 		"""Return RTP packet."""
-		return self.header + self.payload
\ No newline at end of file
+		return b''.join((self.header, self.payload))
+
+
+def encodeFrame(data, seqnum, timestamp, ssrc, pt=26, payloadSize=MAX_RTP_PAYLOAD):
+	"""Packetize a whole frame in one call. Return (packets, last seqnum used).
+
+	Each packet is a single preallocated bytearray; the marker bit is set on the last one.
+	"""
+	view = memoryview(data)
+	total = len(view)
+	packets = []
+	pack_into = HEADER.pack_into
+	for start in range(0, total, payloadSize):
+		end = min(start + payloadSize, total)
+		seqnum += 1
+		packet = bytearray(HEADER_SIZE + end - start)
+		pack_into(packet, 0, 0x80, ((end == total) << 7) | pt,
+			seqnum & 0xFFFF, timestamp & 0xFFFFFFFF, ssrc & 0xFFFFFFFF)
+		packet[HEADER_SIZE:] = view[start:end]
+		packets.append(packet)
+	return packets, seqnum
+
+
+def decodeMany(datagrams):
+	"""Decode a batch of datagrams into RtpPacket objects (zero-copy payloads)."""
+	packets = []
+	for data in datagrams:
+		packet = RtpPacket()
+		packet.decode(data)
+		packets.append(packet)
+	return packets
@@ -0,0 +1,84 @@
+import socket, struct, sys
+
+# Linux UDP generic segmentation offload (UDP_SEGMENT, từ kernel 4.18)
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+# Một lần gửi GSO tối đa 64 segment và không vượt quá kích thước datagram
+MAX_GSO_SEGMENTS = 64
+MAX_GSO_BYTES = 65000
+
+
+class RtpSender:
+	"""Send a frame's RTP packets from (header, payload) pairs without concatenating them.
+
+	The socket is connected to the client so the kernel skips the per-packet address
+	lookup. On Linux a whole frame goes out in one sendmsg using UDP GSO; otherwise
+	each packet is a scatter-gather sendmsg, or a plain send where sendmsg is missing.
+	"""
+
+	def __init__(self, sock, address):
+		self.sock = sock
+		self.address = address
+		sock.connect(address)
+		self.useSendmsg = hasattr(sock, 'sendmsg')
+		self.useGso = self.useSendmsg and sys.platform.startswith('linux')
+
+	def sendFrame(self, packets):
+		"""Send a sequence of (header, payload) pairs in order."""
+		try:
+			if self.useGso and len(packets) > 1:
+				packets = self.sendGso(packets)
+			if self.useSendmsg:
+				sendmsg = self.sock.sendmsg
+				for packet in packets:
+					sendmsg(packet)
+			else:
+				send = self.sock.send
+				for header, payload in packets:
+					send(bytes(header) + payload)
+		except ConnectionRefusedError:
+			# ICMP port unreachable từ gói trước: client chưa/không còn nghe, bỏ qua như sendto
+			pass
+
+	def sendGso(self, packets):
+		"""Send packets as GSO batches of same-size runs. Return the packets left to send one by one.
+
+		The kernel cuts a batch into segments of the first packet's size, so a batch
+		may end with a shorter packet but never holds a longer one: a larger packet
+		(e.g. FEC parity after the media packets) starts the next batch.
+		"""
+		sendmsg = self.sock.sendmsg
+		batched = False
+		start = 0
+		count = len(packets)
+		while start < count:
+			segSize = len(packets[start][0]) + len(packets[start][1])
+			limit = min(count, start + max(1, min(MAX_GSO_SEGMENTS, MAX_GSO_BYTES // segSize)))
+			end = start + 1
+			while end < limit:
+				size = len(packets[end][0]) + len(packets[end][1])
+				if size > segSize:
+					break
+				end += 1
+				if size < segSize:
+					break
+			if end - start == 1:
+				# Gói lẻ (vd. gói FEC) không cần GSO
+				sendmsg(packets[start])
+				start = end
+				continue
+			buffers = []
+			for header, payload in packets[start:end]:
+				buffers.append(header)
+				buffers.append(payload)
+			try:
+				sendmsg(buffers, [(SOL_UDP, UDP_SEGMENT, struct.pack('=H', segSize))])
+			except OSError as e:
+				if isinstance(e, ConnectionRefusedError) or batched:
+					raise
+				# Kernel không hỗ trợ UDP_SEGMENT: chuyển hẳn sang sendmsg từng gói
+				self.useGso = False
+				return packets[start:]
+			batched = True
+			start = end
+		return ()
@@ -0,0 +1,119 @@
+"""Fuzz test and throughput benchmark for RtspParser.
+
+The fuzz pass feeds random pipelined requests cut into random chunks and checks
+that exactly the same requests come out, then feeds random garbage and checks
+that the parser only ever raises RtspError. The benchmark reports requests per
+second for whole and byte-by-byte delivery, against the old one-request-per-recv
+split used before the parser.
+
+Usage: RtspBenchmark.py [Requests] [Seed]
+"""
+import sys, random
+
+from RtspParser import RtspParser, RtspError
+from RtpBenchmark import measure
+
+METHODS = ('SETUP', 'PLAY', 'PAUSE', 'TEARDOWN')
+
+
+def randomRequest(rng, cseq):
+	"""Return (bytes, expected (method, uri, headers, body)) for one random request."""
+	method = rng.choice(METHODS)
+	uri = 'movie%d.mjpeg' % rng.randrange(100)
+	newline = rng.choice(('\n', '\r\n'))
+	headers = {'cseq': str(cseq), 'session': str(rng.randrange(100000, 999999))}
+	if method == 'SETUP':
+		headers['transport'] = 'RTP/UDP; client_port= %d' % rng.randrange(1024, 65536)
+	if method == 'PLAY' and rng.random() < 0.5:
+		headers['range'] = 'npt=%.3f-' % (rng.random() * 100)
+	body = b''
+	if rng.random() < 0.1:
+		body = bytes(rng.randrange(32, 127) for _ in range(rng.randrange(1, 64)))
+		headers['content-length'] = str(len(body))
+	lines = [method + ' ' + uri + ' RTSP/1.0']
+	for name, value in headers.items():
+		# Tên header viết hoa/thường ngẫu nhiên
+		name = ''.join(c.upper() if rng.random() < 0.5 else c for c in name)
+		lines.append(name + ': ' + value)
+	data = (newline.join(lines) + newline + newline).encode() + body
+	return data, (method, uri, headers, body)
+
+
+def chunks(data, rng, maxChunk):
+	pos = 0
+	while pos < len(data):
+		size = rng.randrange(1, maxChunk + 1)
+		yield data[pos:pos + size]
+		pos += size
+
+
+def fuzz(count, rng):
+	"""Round-trip random requests through random chunking. Return the number of mismatches."""
+	requests = [randomRequest(rng, i) for i in range(count)]
+	stream = b''.join(data for data, _ in requests)
+	errors = 0
+	for maxChunk in (1, 7, 256, 4096, len(stream)):
+		parser = RtspParser()
+		parsed = []
+		for chunk in chunks(stream, rng, maxChunk):
+			parsed.extend(parser.feed(chunk))
+		got = [(r.method, r.uri, dict(r.headers), r.body) for r in parsed]
+		if got != [expected for _, expected in requests] or parser.pending():
+			print(f"ERROR: mismatch with chunks up to {maxChunk} bytes")
+			errors += 1
+
+	# Dữ liệu rác: chỉ được phép trả về request hoặc báo RtspError
+	for _ in range(count):
+		parser = RtspParser(maxHeaderSize=512)
+		garbage = bytes(rng.choice(b'\r\n: ;=-ABCabc0123\xff\x00') for _ in range(rng.randrange(1, 2048)))
+		try:
+			for chunk in chunks(garbage, rng, 64):
+				parser.feed(chunk)
+			if parser.pending():
+				parser.flush()
+		except RtspError:
+			pass
+		except Exception as e:
+			print(f"ERROR: {type(e).__name__}: {e} on {garbage[:40]!r}")
+			errors += 1
+	return errors
+
+
+def legacySplit(messages):
+	# Cách cũ: mỗi lần recv là đúng một request
+	for data in messages:
+		request = data.decode("utf-8").split('\n')
+		request[0].split(' ')[0], request[1].split(' ')
+
+
+def parseWhole(stream):
+	return RtspParser().feed(stream)
+
+
+def parseMessages(messages):
+	parser = RtspParser()
+	for data in messages:
+		parser.feed(data)
+
+
+def parseBytes(stream):
+	parser = RtspParser()
+	for i in range(len(stream)):
+		parser.feed(stream[i:i + 1])
+
+
+if __name__ == "__main__":
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 1)
+
+	errors = fuzz(count // 5, rng)
+	print(f"fuzz: {errors} errors\n")
+
+	messages = [randomRequest(rng, i)[0] for i in range(count)]
+	stream = b''.join(messages)
+	measure("split per recv", legacySplit, (messages,), count, "requests/s")
+	measure("parse per recv", parseMessages, (messages,), count, "requests/s")
+	measure("parse pipelined", parseWhole, (stream,), count, "requests/s")
+	small = stream[:len(stream) // 20]
+	measure("parse 1 byte", parseBytes, (small,), len(parseWhole(small)), "requests/s", rounds=1)
+	sys.exit(1 if errors else 0)
@@ -0,0 +1,424 @@
+import socket, threading, time
+
+from RtpPacket import HEADER, HEADER_SIZE
+from JitterBuffer import JitterBuffer
+from Fec import FEC_PT
+from PacketRing import PacketRing, FrameBuffers
+from Rtcp import ReceiverStats, RTCP_INTERVAL
+from Metrics import metrics
+from random import randint
+
+
+class RtspClient:
+	"""RTSP control, RTP reception and RTCP reports of a client, without any GUI.
+
+	Complete frames come out of the jitter buffer through queueFrames();
+	subclasses decide what to do with them (Client shows them, HeadlessClient
+	only measures them).
+	"""
+	INIT = 0
+	READY = 1
+	PLAYING = 2
+	state = INIT
+	
+	SETUP = 0
+	PLAY = 1
+	PAUSE = 2
+	TEARDOWN = 3
+
+	# Jitter buffer: cửa sổ sắp xếp lại (số gói) và chu kỳ kiểm tra khi không có gói (s)
+	REORDER_WINDOW = 64
+	JITTER_POLL = 0.05
+	# Server gửi timestamp = số thứ tự khung hình; số khung hình mỗi giây lấy từ header x-Frame-Rate
+	# của trả lời SETUP, mặc định 20 với server không gửi header này
+	CLOCK_RATE = 20
+	# Số slot nhận gói dựng sẵn và số buffer frame dùng lại (phải lớn hơn số frame người phát giữ cùng lúc)
+	RECEIVE_SLOTS = 1024
+	FRAME_BUFFERS = 4
+	# SO_RCVBUF cho socket RTP: đủ cho một loạt gói của khung hình HD (kernel giới hạn bởi rmem_max)
+	RECEIVE_BUFFER = 4 * 1024 * 1024
+	# In request đã gửi và thống kê cuối phiên
+	verbose = True
+
+	def __init__(self, serveraddr, serverport, rtpport, filename, multicast=False):
+		self.serverAddr = serveraddr
+		self.serverPort = int(serverport)
+		self.rtpPort = int(rtpport)
+		self.fileName = filename
+		# Nhận RTP qua nhóm multicast; địa chỉ nhóm và cổng lấy từ trả lời SETUP
+		self.multicast = multicast
+		self.multicastGroup = None
+		self.rtspSeq = 0
+		self.sessionId = 0
+		self.requestSent = -1
+		self.teardownAcked = 0
+		# Vị trí (giây) gửi kèm PLAY tiếp theo trong header Range
+		self.playRange = None
+		self.clockRate = self.CLOCK_RATE
+		self.connectToServer()
+
+	def setupMovie(self):
+		"""Send SETUP."""
+		if self.state == self.INIT:
+			self.sendRtspRequest(self.SETUP)
+	
+	def exitClient(self):
+		"""Send TEARDOWN and stop playback."""
+		self.sendRtspRequest(self.TEARDOWN)		
+		
+		if hasattr(self, 'playbackStop'):
+			self.playbackStop.set()
+
+	def pauseMovie(self):
+		"""Send PAUSE and stop playback."""
+		if self.state == self.PLAYING:
+			self.sendRtspRequest(self.PAUSE)
+			if hasattr(self, 'playbackStop'):
+				self.playbackStop.set()
+	
+	def playMovie(self):
+		"""Start receiving RTP and send PLAY."""
+		if self.state == self.READY:
+			# Create a new thread to listen for RTP packets
+			self.rtpThread = threading.Thread(target=self.listenRtp)
+			self.rtpThread.start()
+			self.playEvent = threading.Event()
+			self.playEvent.clear()
+			self.sendRtspRequest(self.PLAY)
+	
+	def seekMovie(self, seconds):
+		"""Play from the given position (seconds) with a PLAY Range request.
+
+		While playing, PAUSE is sent first and the PLAY follows its reply.
+		"""
+		self.playRange = seconds
+		if self.state == self.PLAYING:
+			# state vẫn là PLAYING tới khi nhận trả lời PAUSE: PLAY được gửi từ parseRtspReply
+			self.pauseMovie()
+		else:
+			self.playMovie()
+
+	def warn(self, title, message):
+		"""Report a connection problem to the user."""
+		print("%s: %s" % (title, message))
+
+	def startPlayback(self, stop):
+		"""Called when RTP reception starts (before the first frame); stop is set when this run ends."""
+
+	def stopPlayback(self, stop):
+		"""Called when RTP reception stops (PAUSE, TEARDOWN or socket error), with the run's stop event."""
+
+	def listenRtp(self):		
+		"""Listen for RTP packets."""
+		# Nhận thẳng vào slot dựng sẵn; jitter buffer trả slot lại khi frame đã ghép xong hoặc bị bỏ
+		self.packetRing = PacketRing(self.RECEIVE_SLOTS)
+		# Jitter buffer sắp xếp lại gói theo seqnum, phát hiện mất gói và bỏ frame không đầy đủ
+		self.jitterBuffer = JitterBuffer(reorderWindow=self.REORDER_WINDOW, clockRate=self.clockRate,
+			frameBuffers=FrameBuffers(self.FRAME_BUFFERS), recycle=self.packetRing.recycle)
+		receive = self.packetRing.recv
+		push = self.jitterBuffer.push
+		pushParity = self.jitterBuffer.pushParity
+		unpack = HEADER.unpack_from
+		self.currentTimestamp = -1
+
+		# Giữ Event của lượt phát này: PLAY ngay sau PAUSE (seekMovie) tạo Event mới
+		stop = self.playbackStop = threading.Event()
+		self.startPlayback(stop)
+
+		self.rtpSocket.settimeout(self.JITTER_POLL)
+
+		while not stop.is_set():
+			try:
+				data = receive(self.rtpSocket) #Nhận gói từ Server, không cấp phát bytes mới
+			except socket.timeout:
+				# Không có gói mới: vẫn phải bỏ các frame thiếu gói đã quá hạn
+				self.queueFrames(self.jitterBuffer.poll())
+				continue
+			except Exception:
+				if self.teardownAcked == 1:
+					self.rtpSocket.shutdown(socket.SHUT_RDWR)
+					self.rtpSocket.close()
+				break
+
+			
+			started = metrics.start()
+			if len(data) < HEADER_SIZE:
+				self.packetRing.recycle((data,))
+				continue
+			# Đọc header ngay trên slot thay vì tạo RtpPacket cho mỗi gói
+			# timestamp cũng là số thứ tự khung hình (frame number); marker = 1 ở gói cuối của khung hình
+			_, mpt, seq, timestamp, ssrc = unpack(data)
+			if started:
+				metrics.stop('client.receive', started)
+				metrics.count('client.packets')
+				metrics.count('client.bytes', len(data))
+				started = metrics.start()
+
+			if mpt & 0x7F == FEC_PT:
+				# Gói parity (server chạy với --fec): dựng lại gói bị mất rồi trả slot ngay
+				frames = pushParity(timestamp, data[HEADER_SIZE:])
+				self.packetRing.recycle((data,))
+			else:
+				# Chỉ trả ra các frame đã đủ gói, theo đúng thứ tự
+				frames = push(seq, timestamp, mpt >> 7, data[HEADER_SIZE:])
+			if started:
+				metrics.stop('client.reassemble', started)
+				metrics.count('client.frames', len(frames))
+			self.queueFrames(frames)
+
+		self.stopPlayback(stop)
+		if metrics.enabled:
+			metrics.count('client.packetsLost', self.jitterBuffer.lost())
+			metrics.count('client.framesDropped', self.jitterBuffer.framesDropped)
+			metrics.count('client.recovered', self.jitterBuffer.recovered)
+		if self.verbose:
+			print("RTP stats:", self.jitterBuffer.stats())
+			if hasattr(self, 'rtcpStats'):
+				print("RTCP stats:", self.rtcpStats.stats())
+
+	def queueFrames(self, frames):
+		"""Take the (timestamp, frame) pairs released by the jitter buffer."""
+		for timestamp, frame in frames:
+			self.currentTimestamp = timestamp
+
+	def connectToServer(self):
+		"""Connect to the Server. Start a new RTSP/TCP session."""
+		self.rtspSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		try:
+			self.rtspSocket.connect((self.serverAddr, self.serverPort))
+		except:
+			self.warn('Connection Failed', 'Connection to \'%s\' failed.' %self.serverAddr)
+	
+	def sendRtspRequest(self, requestCode):
+		"""Send RTSP request to the server."""	
+		
+		# Setup request
+		if requestCode == self.SETUP and self.state == self.INIT:
+			threading.Thread(target=self.recvRtspReply).start()
+			# Update RTSP sequence number.
+			self.rtspSeq += 1
+			
+			# Write the RTSP request to be sent.
+			request = "SETUP " + str(self.fileName) + " RTSP/1.0\nCSeq: " + str(self.rtspSeq) + "\nTransport: RTP/UDP; client_port= " + str(self.rtpPort)
+			if self.multicast:
+				request = "SETUP " + str(self.fileName) + " RTSP/1.0\nCSeq: " + str(self.rtspSeq) + "\nTransport: RTP/AVP;multicast"
+			
+			# Keep track of the sent request.
+			self.requestSent = self.SETUP
+		
+		# Play request
+		elif requestCode == self.PLAY and self.state == self.READY:
+			# Update RTSP sequence number.
+			self.rtspSeq += 1
+			
+			# Write the RTSP request to be sent.
+			request = "PLAY " + str(self.fileName) + " RTSP/1.0\nCSeq: " + str(self.rtspSeq) + "\nSession: " + str(self.sessionId)
+			if self.playRange is not None:
+				request += "\nRange: npt=%.3f-" % self.playRange
+				self.playRange = None
+			
+			# Keep track of the sent request.
+			self.requestSent = self.PLAY
+		
+		# Pause request
+		elif requestCode == self.PAUSE and self.state == self.PLAYING:
+			# Update RTSP sequence number.
+			self.rtspSeq += 1
+			
+			# Write the RTSP request to be sent.
+			request = "PAUSE " + str(self.fileName) + " RTSP/1.0\nCSeq: " + str(self.rtspSeq) + "\nSession: " + str(self.sessionId)
+			
+			# Keep track of the sent request.
+			self.requestSent = self.PAUSE
+			
+		# Teardown request
+		elif requestCode == self.TEARDOWN and not self.state == self.INIT:
+			# Update RTSP sequence number.
+			self.rtspSeq += 1
+			
+			# Write the RTSP request to be sent.
+			request = "TEARDOWN " + str(self.fileName) + " RTSP/1.0\nCSeq: " + str(self.rtspSeq) + "\nSession: " + str(self.sessionId)
+			
+			# Keep track of the sent request.
+			self.requestSent = self.TEARDOWN
+		else:
+			return
+		
+		# Send the RTSP request using rtspSocket.
+		# Dòng trống kết thúc request để server tách được các request liên tiếp
+		self.rtspSocket.send((request + "\n\n").encode("utf-8"))
+		
+		if self.verbose:
+			print('\nData sent:\n' + request)
+	
+	def recvRtspReply(self):
+		"""Receive RTSP reply from the server."""
+		while True:
+			try:
+				reply = self.rtspSocket.recv(1024)
+			except OSError:
+				break
+			
+			if reply: 
+				self.parseRtspReply(reply.decode("utf-8"))
+			elif self.requestSent != self.TEARDOWN:
+				# Server đóng kết nối: dừng thay vì lặp mãi với recv() rỗng
+				self.rtspSocket.close()
+				break
+			
+			# Close the RTSP socket upon requesting Teardown
+			if self.requestSent == self.TEARDOWN:
+				self.rtspSocket.shutdown(socket.SHUT_RDWR)
+				self.rtspSocket.close()
+				break
+	
+	def parseRtspReply(self, data):
+		"""Parse the RTSP reply from the server."""
+		lines = data.split('\n')
+		seqNum = int(lines[1].split(' ')[1])
+		
+		# Process only if the server reply's sequence number is the same as the request's
+		if seqNum == self.rtspSeq:
+			if int(lines[0].split(' ')[1]) != 200:
+				# Trả lời lỗi không có dòng Session (vd. 404 cho SETUP): giữ nguyên trạng thái
+				self.warn('Request Failed', lines[0].strip())
+				return
+			session = int(lines[2].split(' ')[1])
+			# New RTSP session ID
+			if self.sessionId == 0:
+				self.sessionId = session
+			
+			# Process only if the session ID is the same
+			if self.sessionId == session:
+				if int(lines[0].split(' ')[1]) == 200: 
+					if self.requestSent == self.SETUP:
+						if self.multicast:
+							self.parseTransport(lines[3:])
+						self.parseFrameRate(lines[3:])
+						
+						# Open RTP port.
+						self.openRtpPort() 
+						
+						# Update RTSP state (sau khi đã có socket RTP để PLAY dùng).
+						self.state = self.READY
+					elif self.requestSent == self.PLAY:
+						self.state = self.PLAYING
+					elif self.requestSent == self.PAUSE:
+						self.state = self.READY
+						
+						# The play thread exits. A new thread is created on resume.
+						self.playEvent.set()
+
+						if self.playRange is not None:
+							# seekMovie: PLAY với Range khi thread nhận RTP cũ đã dừng hẳn
+							self.rtpThread.join()
+							self.playMovie()
+					elif self.requestSent == self.TEARDOWN:
+						self.state = self.INIT
+						
+						# Flag the teardownAcked to close the socket.
+						self.teardownAcked = 1 
+	
+	def parseTransport(self, lines):
+		"""Read the multicast group and port from the Transport header of the SETUP reply."""
+		for line in lines:
+			name, _, value = line.partition(':')
+			if name.strip().lower() != 'transport':
+				continue
+			for param in value.strip().split(';'):
+				key, _, val = param.partition('=')
+				if key == 'destination':
+					self.multicastGroup = val
+				elif key == 'port':
+					self.rtpPort = int(val.split('-')[0])
+
+	def parseFrameRate(self, lines):
+		"""Read the clock rate of the RTP timestamps from the x-Frame-Rate header of the SETUP reply."""
+		for line in lines:
+			name, _, value = line.partition(':')
+			if name.strip().lower() == 'x-frame-rate':
+				try:
+					rate = float(value)
+				except ValueError:
+					return
+				if rate > 0:
+					self.clockRate = rate
+				return
+
+	def openRtpPort(self):
+		"""Open RTP socket binded to a specified port."""
+		# Create a new datagram socket to receive RTP packets from the server
+		self.rtpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		if self.multicastGroup is not None:
+			self.joinGroup()
+			return
+		
+		# Set the timeout value of the socket to 0.5sec
+		self.rtpSocket.settimeout(0.5)
+		self.sizeReceiveBuffer()
+		
+		try:
+			# Bind the socket to the address using the RTP port given by the client user
+			self.rtpSocket.bind(('', self.rtpPort))
+		except:
+			self.warn('Unable to Bind', 'Unable to bind PORT=%d' %self.rtpPort)
+		self.openRtcpPort()
+
+	def sizeReceiveBuffer(self):
+		"""Enlarge the kernel receive buffer so a burst of HD packets is not dropped."""
+		try:
+			self.rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECEIVE_BUFFER)
+		except OSError:
+			pass
+
+	def openRtcpPort(self):
+		"""Open the RTCP socket on RTP port + 1 and start sending receiver reports."""
+		self.rtcpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.rtcpSocket.settimeout(RTCP_INTERVAL / 2)
+		try:
+			self.rtcpSocket.bind(('', self.rtpPort + 1))
+		except OSError:
+			self.rtcpSocket.close()
+			return
+		self.rtcpStats = ReceiverStats(randint(0, 0xFFFFFFFF))
+		threading.Thread(target=self.listenRtcp, daemon=True).start()
+
+	def listenRtcp(self):
+		"""Receive sender reports and answer with a receiver report every RTCP_INTERVAL."""
+		serverAddr = None
+		nextReport = time.monotonic() + RTCP_INTERVAL
+		while self.teardownAcked == 0:
+			try:
+				data, addr = self.rtcpSocket.recvfrom(2048)
+				# RR được gửi về đúng địa chỉ đã gửi SR
+				serverAddr = addr
+				self.rtcpStats.onRtcp(data)
+			except socket.timeout:
+				pass
+			except OSError:
+				break
+			now = time.monotonic()
+			if now >= nextReport and serverAddr is not None:
+				nextReport = now + RTCP_INTERVAL
+				report = self.rtcpStats.receiverReport(getattr(self, 'jitterBuffer', None))
+				if report is not None:
+					try:
+						self.rtcpSocket.sendto(report, serverAddr)
+					except OSError:
+						pass
+		self.rtcpSocket.close()
+
+	def joinGroup(self):
+		"""Bind the RTP port and join the multicast group announced by the server."""
+		self.rtpSocket.settimeout(0.5)
+		self.sizeReceiveBuffer()
+		# Nhiều người xem trên cùng máy dùng chung cổng của nhóm
+		self.rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		# Tham gia nhóm trên giao diện đang dùng để nói chuyện với server (loopback khi thử trên một máy)
+		interface = self.rtspSocket.getsockname()[0]
+		membership = socket.inet_aton(self.multicastGroup) + socket.inet_aton(interface)
+		try:
+			self.rtpSocket.bind(('', self.rtpPort))
+			self.rtpSocket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+		except OSError:
+			self.warn('Unable to Join', 'Unable to join %s:%d' % (self.multicastGroup, self.rtpPort))
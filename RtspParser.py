@@ -0,0 +1,156 @@
+import re
+
+# Giới hạn phần header của một request; vượt quá thì coi là rác và bỏ kết nối
+MAX_HEADER_SIZE = 8192
+MAX_BODY_SIZE = 65536
+
+# Request kết thúc bởi một dòng trống (CRLF hoặc LF)
+TERMINATOR = re.compile(rb'\r?\n\r?\n')
+
+
+class RtspError(Exception):
+	"""Malformed or oversized RTSP message."""
+
+
+class Headers(dict):
+	"""Header dictionary with case-insensitive names (keys are stored lower-case)."""
+
+	def __init__(self, items=()):
+		super().__init__()
+		for name, value in items:
+			self[name] = value
+
+	def __setitem__(self, name, value):
+		super().__setitem__(name.lower(), value)
+
+	def __getitem__(self, name):
+		return super().__getitem__(name.lower())
+
+	def __contains__(self, name):
+		return super().__contains__(name.lower())
+
+	def get(self, name, default=None):
+		return super().get(name.lower(), default)
+
+
+class RtspRequest:
+	__slots__ = ('method', 'uri', 'version', 'headers', 'body')
+
+	def __init__(self, method, uri, version, headers, body=b''):
+		self.method = method
+		self.uri = uri
+		self.version = version
+		self.headers = headers
+		self.body = body
+
+	def cseq(self):
+		return self.headers.get('CSeq', '0')
+
+	def __repr__(self):
+		return 'RtspRequest(%r, %r, %r)' % (self.method, self.uri, dict(self.headers))
+
+
+def parseHead(head):
+	"""Parse the request line and headers of one message (bytes, without the blank line)."""
+	lines = head.decode('utf-8', 'replace').splitlines()
+	parts = lines[0].split()
+	if len(parts) < 2:
+		raise RtspError('bad request line: %r' % lines[0])
+	version = parts[2] if len(parts) > 2 else 'RTSP/1.0'
+	headers = Headers()
+	for line in lines[1:]:
+		name, sep, value = line.partition(':')
+		if not sep:
+			raise RtspError('bad header line: %r' % line)
+		headers[name.strip()] = value.strip()
+	return RtspRequest(parts[0], parts[1], version, headers)
+
+
+class RtspParser:
+	"""Incremental RTSP request parser.
+
+	feed() takes whatever bytes the transport delivered and returns every request
+	completed so far; partial requests stay buffered and pipelined requests come
+	out in order. A request ends with an empty line (\\r\\n\\r\\n or \\n\\n), followed
+	by Content-Length bytes of body if that header is present.
+	"""
+
+	def __init__(self, maxHeaderSize=MAX_HEADER_SIZE):
+		self.maxHeaderSize = maxHeaderSize
+		self.buffer = bytearray()
+		self.request = None # request đã đọc xong header, đang chờ body
+		self.bodyLength = 0
+		self.scanned = 0 # phần đầu buffer đã tìm mà không thấy dòng trống
+
+	def feed(self, data):
+		"""Add received bytes. Return the list of complete RtspRequest objects."""
+		buf = self.buffer
+		buf += data
+		requests = []
+		pos = 0 # chỉ xoá phần đã xử lý một lần ở cuối, kể cả khi có nhiều request liên tiếp
+		try:
+			while True:
+				if self.request is None:
+					# Bỏ dòng trống giữa các request liên tiếp
+					while pos < len(buf) and buf[pos] in b'\r\n':
+						pos += 1
+					# Không quét lại từ đầu khi request đến từng mảnh nhỏ
+					match = TERMINATOR.search(buf, max(pos, self.scanned))
+					if match is None:
+						if len(buf) - pos > self.maxHeaderSize:
+							raise RtspError('header too large')
+						# Dòng trống có thể bắt đầu trong 3 byte cuối
+						self.scanned = max(pos, len(buf) - 3)
+						break
+					self.scanned = 0
+					self.request = parseHead(bytes(buf[pos:match.start()]))
+					pos = match.end()
+					try:
+						self.bodyLength = int(self.request.headers.get('Content-Length', 0))
+					except ValueError:
+						raise RtspError('bad Content-Length')
+					if not 0 <= self.bodyLength <= MAX_BODY_SIZE:
+						raise RtspError('bad Content-Length')
+				if len(buf) - pos < self.bodyLength:
+					break
+				request, self.request = self.request, None
+				request.body = bytes(buf[pos:pos + self.bodyLength])
+				pos += self.bodyLength
+				requests.append(request)
+		finally:
+			del buf[:pos]
+			self.scanned = max(0, self.scanned - pos)
+		return requests
+
+	def flush(self):
+		"""Treat buffered bytes as one complete request.
+
+		For older clients that send each request in one write without the
+		terminating empty line. Return the request, or None if nothing is buffered.
+		"""
+		if self.request is not None:
+			request, self.request = self.request, None
+			request.body = bytes(self.buffer)
+			self.buffer.clear()
+			return request
+		head = bytes(self.buffer).strip(b'\r\n')
+		self.buffer.clear()
+		self.scanned = 0
+		if not head:
+			return None
+		return parseHead(head)
+
+	def pending(self):
+		"""True if part of a request is buffered."""
+		return self.request is not None or bool(self.buffer.strip(b'\r\n'))
+
+
+def transportParams(value):
+	"""Split a Transport header into a dict of lower-case parameters ('client_port' -> '25000')."""
+	params = {}
+	for param in value.split(';'):
+		key, sep, val = param.partition('=')
+		key = key.strip().lower()
+		if key:
+			params[key] = val.strip() if sep else True
+	return params
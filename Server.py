@@ -1,18 +1,150 @@
-import sys, socket
+import sys, socket, multiprocessing, signal, json, copy
+
+from ServerWorker import ServerWorker, sessionStats
+from BroadcastChannel import (channelHub, MulticastOutput, PortPool, MULTICAST_TTL, MULTICAST_PORT,
+	MAX_MULTICAST_PORT, TIMESHIFT_SECONDS, TIMESHIFT_BYTES)
+from Fec import MAX_GROUP
+from Metrics import metrics
+
+
+class ServerConfig:
+	"""Command-line options of the server.
+
+	Kept as plain values and applied to the class attributes and singletons by
+	apply() in every process that serves sessions: worker processes started with
+	spawn or forkserver do not inherit what the parent set on them.
+	"""
+
+	def __init__(self):
+		self.multicastTtl = MULTICAST_TTL
+		# Dải cổng multicast (RTP chẵn đầu tiên, cuối cùng) của tiến trình
+		self.multicastPorts = (MULTICAST_PORT, MAX_MULTICAST_PORT)
+		self.timeshiftSeconds = TIMESHIFT_SECONDS
+		self.timeshiftBytes = TIMESHIFT_BYTES
+		self.fecGroup = 0
+		self.verbose = True
+		self.metrics = False
+		self.metricsPort = None
+
+	def apply(self):
+		channelHub.multicastTtl = self.multicastTtl
+		channelHub.ports = PortPool(*self.multicastPorts)
+		channelHub.timeshiftSeconds = self.timeshiftSeconds
+		channelHub.timeshiftBytes = self.timeshiftBytes
+		ServerWorker.fecGroup = MulticastOutput.fecGroup = self.fecGroup
+		ServerWorker.verbose = self.verbose
+		metrics.enabled = self.metrics
 
-from ServerWorker import ServerWorker
 
 class Server:	
 	
 	def main(self):
+		config = self.config = ServerConfig()
 		try:
 			SERVER_PORT = int(sys.argv[1])
+			options = sys.argv[2:]
+			# Chế độ asyncio: một luồng duy nhất cho mọi session
+			useAsync = '--async' in options
+			workers = 1
+			if '--workers' in options:
+				workers = int(options[options.index('--workers') + 1])
+			# TTL của gói multicast (1 = chỉ trong LAN)
+			if '--multicast-ttl' in options:
+				config.multicastTtl = int(options[options.index('--multicast-ttl') + 1])
+			# Cửa sổ time-shift (s) của các kênh live/: PLAY với Range có thể lùi lại trong cửa sổ này
+			if '--timeshift' in options:
+				config.timeshiftSeconds = float(options[options.index('--timeshift') + 1])
+			if '--timeshift-mb' in options:
+				config.timeshiftBytes = int(float(options[options.index('--timeshift-mb') + 1]) * 1024 * 1024)
+			# FEC: thêm một gói parity cho mỗi N gói RTP của một khung hình (N <= 16)
+			if '--fec' in options:
+				config.fecGroup = int(options[options.index('--fec') + 1])
+				if not 0 < config.fecGroup <= MAX_GROUP:
+					raise ValueError(config.fecGroup)
+			# --quiet: không in từng request nhận được
+			config.verbose = '--quiet' not in options
+			# Đo thời gian từng công đoạn; --metrics-port N phục vụ số liệu trên 127.0.0.1:N
+			config.metrics = '--metrics' in options
+			if '--metrics-port' in options:
+				config.metricsPort = int(options[options.index('--metrics-port') + 1])
 		except:
-			print("[Usage: Server.py Server_port]\n")
+			print("[Usage: Server.py Server_port [--async] [--workers N] [--multicast-ttl N] [--timeshift S] [--timeshift-mb N] [--fec N] [--quiet] [--metrics] [--metrics-port N]]\n")
 			sys.exit()
+
+		if workers <= 1:
+			config.apply()
+			self.serve(SERVER_PORT, useAsync, self.listenSocket(SERVER_PORT))
+			return
+
+		# Nhiều tiến trình: mỗi tiến trình có GIL, session và socket RTP riêng
+		if hasattr(socket, 'SO_REUSEPORT'):
+			# Mỗi worker tự bind cổng RTSP; kernel chia kết nối giữa các worker
+			args = [(SERVER_PORT, useAsync, None, workerConfig) for workerConfig in self.workerConfigs(workers)]
+		else:
+			# Không có SO_REUSEPORT: các worker cùng accept trên socket của tiến trình cha
+			rtspSocket = self.listenSocket(SERVER_PORT)
+			args = [(SERVER_PORT, useAsync, rtspSocket, workerConfig) for workerConfig in self.workerConfigs(workers)]
+
+		processes = [multiprocessing.Process(target=self.serveWorker, args=arg, daemon=True) for arg in args]
+		for process in processes:
+			process.start()
+		try:
+			for process in processes:
+				process.join()
+		except KeyboardInterrupt:
+			for process in processes:
+				process.terminate()
+
+	def workerConfigs(self, workers):
+		"""One config per worker, each with its own slice of the multicast ports.
+
+		Every worker has its own channels: with a shared range two of them would
+		send different channels to the same group and port.
+		"""
+		first, last = self.config.multicastPorts
+		span = (last - first + 2) // workers // 2 * 2
+		configs = []
+		for i in range(workers):
+			config = copy.copy(self.config)
+			config.multicastPorts = (first + i * span, first + (i + 1) * span - 2)
+			configs.append(config)
+		return configs
+
+	def listenSocket(self, port, reusePort=False):
+		"""Create the RTSP listening socket."""
 		rtspSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		rtspSocket.bind(('', SERVER_PORT))
+		if reusePort:
+			rtspSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		rtspSocket.bind(('', port))
 		rtspSocket.listen(5) # Listen for up to 5 clients
+		return rtspSocket
+
+	def serveWorker(self, port, useAsync, rtspSocket, config):
+		"""Entry point of a worker process."""
+		# Với spawn/forkserver tiến trình con bắt đầu từ các giá trị mặc định của module
+		config.apply()
+		if rtspSocket is None:
+			rtspSocket = self.listenSocket(port, reusePort=True)
+		try:
+			self.serve(port, useAsync, rtspSocket)
+		except KeyboardInterrupt:
+			pass
+
+	def serve(self, port, useAsync, rtspSocket):
+		"""Accept RTSP clients on a bound socket until the process exits."""
+		# kill -USR1 <pid>: in bộ đếm RTCP của mọi session dạng JSON
+		if hasattr(signal, 'SIGUSR1'):
+			signal.signal(signal.SIGUSR1, self.dumpStats)
+		# kill -USR2 <pid>: in bộ đếm và histogram thời gian các công đoạn dạng JSON
+		if hasattr(signal, 'SIGUSR2'):
+			signal.signal(signal.SIGUSR2, self.dumpMetrics)
+		if self.config.metricsPort is not None:
+			# Với --workers chỉ tiến trình đầu tiên giữ được cổng; các tiến trình khác dùng SIGUSR2
+			metrics.serve(self.config.metricsPort)
+		if useAsync:
+			from AsyncServer import AsyncServer
+			AsyncServer().main(port, rtspSocket)
+			return
 
 		# Receive client info (address,port) through RTSP/TCP session
 		while True:
@@ -20,6 +152,12 @@ class Server:
 			clientInfo['rtspSocket'] = rtspSocket.accept()
 			ServerWorker(clientInfo).run()		
 
+	def dumpStats(self, signum=None, frame=None):
+		print(json.dumps(sessionStats()), flush=True)
+
+	def dumpMetrics(self, signum=None, frame=None):
+		print(json.dumps(metrics.snapshot()), flush=True)
+
 if __name__ == "__main__":
 	(Server()).main()
 
@@ -1,9 +1,66 @@
 from random import randint
-import sys, traceback, threading, socket
+import sys, traceback, threading, socket, select, weakref
 
-from VideoStream import VideoStream
+from MediaStore import mediaStore
 from RtpPacket import RtpPacket
-from time import time
+from PacketCache import patchHeader
+from Fec import addParity
+from RtpSender import RtpSender
+from FrameScheduler import frameScheduler
+from BroadcastChannel import channelHub, CHANNEL_PREFIX
+from RtspParser import RtspParser, RtspError, transportParams
+from Rtcp import SenderStats, RTCP_INTERVAL
+from Renditions import RenditionController
+from Metrics import metrics
+from time import time, monotonic
+
+# Kích thước mỗi lần đọc trên kết nối RTSP
+RECV_SIZE = 4096
+# Client cũ gửi mỗi request trong một lần ghi, không có dòng trống kết thúc:
+# nếu không có thêm dữ liệu trong khoảng này thì coi phần đang đệm là một request
+LEGACY_WAIT = 0.05
+
+# Header trả lời SETUP cho biết số khung hình mỗi giây, cũng là clock rate của timestamp RTP
+FRAME_RATE_HEADER = 'x-Frame-Rate'
+
+# Các session đang mở, để đọc bộ đếm RTCP (sessionStats)
+activeSessions = weakref.WeakSet()
+metrics.gauge('server.sessions', lambda: len(activeSessions))
+
+
+def sessionStats():
+	"""Return the transport counters of every open session as a list of dicts."""
+	return [session.stats() for session in list(activeSessions)]
+
+def parseRange(value, frameRate):
+	"""Parse a Range value (npt=<seconds|h:m:s>- or frames=<n>-). Return a 0-based frame index or None."""
+	try:
+		unit, _, spec = value.partition('=')
+		start = spec.split('-')[0].strip()
+		unit = unit.strip().lower()
+		if unit == 'frames':
+			return int(start)
+		if unit == 'npt':
+			if start in ('', 'now'):
+				return None
+			seconds = 0.0
+			for part in start.split(':'):
+				seconds = seconds * 60 + float(part)
+			return int(seconds * frameRate)
+	except ValueError:
+		pass
+	return None
+
+def parsePort(value):
+	"""Parse the RTP port of a client_port value (port or port-port). Return None if it is not usable."""
+	try:
+		port = int(value.split('-')[0])
+	except ValueError:
+		return None
+	# RTCP dùng cổng kế tiếp nên cổng RTP phải nhỏ hơn 65535
+	if not 0 < port < 65535:
+		return None
+	return port
 
 class ServerWorker:
 	SETUP = 'SETUP'
@@ -19,12 +76,30 @@ class ServerWorker:
 	OK_200 = 0
 	FILE_NOT_FOUND_404 = 1
 	CON_ERR_500 = 2
+	UNSUPPORTED_TRANSPORT_461 = 3
+	ERRORS = {
+		FILE_NOT_FOUND_404: '404 NOT FOUND',
+		CON_ERR_500: '500 CONNECTION ERROR',
+		UNSUPPORTED_TRANSPORT_461: '461 UNSUPPORTED TRANSPORT',
+	}
 	
 	clientInfo = {}
+
+	# Số gói RTP tối đa gửi trong một đợt; các đợt được trải đều trong một khung hình
+	PACING_BURST = 12
+	# In request nhận được và lỗi gửi; Server --quiet tắt đi vì print chậm trên đường xử lý
+	verbose = True
+	# FEC: một gói parity XOR cho mỗi nhóm fecGroup gói của một khung hình (0 = tắt, tối đa 16)
+	fecGroup = 0
 	
 	def __init__(self, clientInfo):
 		self.clientInfo = clientInfo
 		self.seqnum = 0
+		# Gói FEC có dãy sequence number riêng để không tạo lỗ trong dãy của gói media
+		self.fecSeq = 0
+		self.pending = []
+		self.nextReport = 0.0
+		activeSessions.add(self)
 		
 	def run(self):
 		threading.Thread(target=self.recvRtspRequest).start()
@@ -32,139 +107,412 @@ class ServerWorker:
 	def recvRtspRequest(self):
 		"""Receive RTSP request from the client."""
 		connSocket = self.clientInfo['rtspSocket'][0]
-		while True:            
-			data = connSocket.recv(256)
-			if data:
-				print("Data received:\n" + data.decode("utf-8"))
-				self.processRtspRequest(data.decode("utf-8"))
+		# Bộ đệm tách request theo dòng trống, hỗ trợ request bị chia nhỏ hoặc gửi liên tiếp
+		parser = RtspParser()
+		try:
+			while True:            
+				try:
+					data = connSocket.recv(RECV_SIZE)
+				except OSError:
+					data = b''
+				if not data:
+					# Client đã ngắt kết nối: dừng lại thay vì lặp vô hạn
+					break
+				if self.verbose:
+					print("Data received:\n" + data.decode("utf-8", "replace"))
+				try:
+					requests = parser.feed(data)
+					if not requests and parser.pending() and not select.select([connSocket], [], [], LEGACY_WAIT)[0]:
+						requests = [parser.flush()]
+				except RtspError as e:
+					metrics.count('server.errors')
+					print("RTSP error: %s" % e)
+					break
+				for request in requests:
+					started = metrics.start()
+					self.processRtspRequest(request)
+					metrics.stop('server.rtsp', started)
+		except Exception:
+			# Lỗi bất ngờ khi xử lý request: vẫn trả asset/kênh và đóng kết nối
+			metrics.count('server.errors')
+			traceback.print_exc()
+		finally:
+			self.closeSession()
+			connSocket.close()
 	
-	def processRtspRequest(self, data):
+	def processRtspRequest(self, request):
 		"""Process RTSP request sent from the client."""
 		# Get the request type
-		request = data.split('\n')
-		line1 = request[0].split(' ')
-		requestType = line1[0]
+		requestType = request.method
 		
 		# Get the media file name
-		filename = line1[1]
+		filename = request.uri
 		
 		# Get the RTSP sequence number 
-		seq = request[1].split(' ')
+		seq = request.cseq()
 		
 		# Process SETUP request
 		if requestType == self.SETUP:
 			if self.state == self.INIT:
 				# Update state
-				print("processing SETUP\n")
+				if self.verbose:
+					print("processing SETUP\n")
 				
+				transport = transportParams(request.headers.get('Transport', ''))
+				# Transport: RTP/AVP;multicast -> gửi một lần tới nhóm multicast của kênh
+				multicast = 'multicast' in transport
+				if not multicast:
+					# Get the RTP/UDP port from the Transport header
+					rtpPort = parsePort(transport.get('client_port', ''))
+					if rtpPort is None:
+						self.replyRtsp(self.UNSUPPORTED_TRANSPORT_461, seq)
+						return
+					self.clientInfo['rtpPort'] = rtpPort
+				headers = {}
 				try:
-					self.clientInfo['videoStream'] = VideoStream(filename)
-					self.state = self.READY
+					if multicast:
+						# Multicast chỉ có nghĩa với kênh phát chung
+						name = filename[len(CHANNEL_PREFIX):] if filename.startswith(CHANNEL_PREFIX) else filename
+						channel = channelHub.open(name)
+						self.clientInfo['channel'] = channel
+						self.clientInfo['multicast'] = True
+						headers['Transport'] = channel.openMulticast(self.localAddress()).transport()
+					elif filename.startswith(CHANNEL_PREFIX):
+						# Kênh phát chung: mọi người xem thấy cùng một vị trí
+						self.clientInfo['channel'] = channelHub.open(filename[len(CHANNEL_PREFIX):])
+					else:
+						# Dùng chung asset đã mmap với các session khác
+						self.clientInfo['videoStream'] = mediaStore.openStream(filename)
 				except IOError:
-					self.replyRtsp(self.FILE_NOT_FOUND_404, seq[1])
+					# Không mở được nguồn hoặc hết cổng multicast: trả lỗi và ở lại INIT
+					channel = self.clientInfo.pop('channel', None)
+					if channel is not None:
+						channelHub.release(channel)
+					self.clientInfo.pop('multicast', None)
+					self.replyRtsp(self.FILE_NOT_FOUND_404, seq)
+					return
+				self.state = self.READY
 				
 				# Generate a randomized RTSP session ID
 				self.clientInfo['session'] = randint(100000, 999999)
+				# RTP SSRC riêng cho session
+				self.clientInfo['ssrc'] = randint(0, 0xFFFFFFFF)
+				# Bộ đếm gửi và báo cáo RTCP từ client (timestamp RTP là số khung hình)
+				source = self.clientInfo.get('videoStream') or self.clientInfo.get('channel')
+				frameRate = source.frameRate if source is not None else 20
+				self.clientInfo['stats'] = SenderStats(self.clientInfo['ssrc'], frameRate)
+				if source is not None:
+					# Clock rate của timestamp RTP (container có thể khác 20 fps); không có SDP nên gửi trong SETUP
+					headers[FRAME_RATE_HEADER] = '%g' % frameRate
+				# Chọn rendition theo báo cáo RTCP (chỉ với stream riêng, không với kênh phát chung)
+				if 'videoStream' in self.clientInfo:
+					self.clientInfo['abr'] = RenditionController(self.clientInfo['videoStream'].renditionCount())
 				
 				# Send RTSP reply
-				self.replyRtsp(self.OK_200, seq[1])
-				
-				# Get the RTP/UDP port from the last line
-				self.clientInfo['rtpPort'] = request[2].split(' ')[3]
+				self.replyRtsp(self.OK_200, seq, headers)
 		
 		# Process PLAY request 		
 		elif requestType == self.PLAY:
 			if self.state == self.READY:
-				print("processing PLAY\n")
+				if self.verbose:
+					print("processing PLAY\n")
 				self.state = self.PLAYING
+
+				# Range: nhảy tới khung hình yêu cầu qua bảng offset, không cần đọc bỏ
+				headers = {}
+				rangeValue = request.headers.get('Range')
+				stream = self.clientInfo.get('videoStream')
+				if rangeValue is not None and stream is not None:
+					frame = parseRange(rangeValue, stream.frameRate)
+					if frame is not None:
+						stream.seek(frame)
+						self.pending = []
+						headers['Range'] = 'npt=%.3f-' % (stream.frameNbr() / stream.frameRate)
+				channel = self.clientInfo.get('channel')
+				if channel is not None and channel.timeshift is not None and not self.clientInfo.get('multicast'):
+					headers['Range'] = self.seekChannel(channel, rangeValue)
 				
-				# Create a new socket for RTP/UDP
-				self.clientInfo["rtpSocket"] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-				
-				self.replyRtsp(self.OK_200, seq[1])
+				self.replyRtsp(self.OK_200, seq, headers)
 				
-				# Create a new thread and start sending RTP packets
-				self.clientInfo['event'] = threading.Event()
-				self.clientInfo['worker']= threading.Thread(target=self.sendRtp) 
-				self.clientInfo['worker'].start()
+				# Start sending RTP packets
+				self.startRtp()
 		
 		# Process PAUSE request
 		elif requestType == self.PAUSE:
 			if self.state == self.PLAYING:
-				print("processing PAUSE\n")
+				if self.verbose:
+					print("processing PAUSE\n")
 				self.state = self.READY
 				
-				self.clientInfo['event'].set()
+				self.stopRtp()
 			
-				self.replyRtsp(self.OK_200, seq[1])
+				self.replyRtsp(self.OK_200, seq)
 		
 		# Process TEARDOWN request
 		elif requestType == self.TEARDOWN:
-			print("processing TEARDOWN\n")
+			if self.verbose:
+				print("processing TEARDOWN\n")
 
-			self.clientInfo['event'].set()
+			self.stopRtp()
 			
-			self.replyRtsp(self.OK_200, seq[1])
+			self.replyRtsp(self.OK_200, seq)
 			
-			# Close the RTP socket
-			self.clientInfo['rtpSocket'].close()
-			
-	# Được gọi ở hàm xử lý PLAY		
-	def sendRtp(self):
-		"""Send RTP packets over UDP."""
-		MAX_RTP_PAYLOAD = 1400
+			# Close the RTP socket and release the shared media asset
+			self.closeSession()
+
+	def seekChannel(self, channel, rangeValue):
+		"""Pick where PLAY starts on a time-shifted channel. Return the Range reply value.
+
+		A Range inside the window replays from there; resuming after PAUSE without
+		a Range continues from the last frame sent; anything else plays live.
+		"""
+		frame = None
+		if rangeValue is not None:
+			frame = parseRange(rangeValue, channel.frameRate)
+		elif 'position' in self.clientInfo:
+			frame = self.clientInfo['position'] + 1
+		cursor = channel.startPosition(frame)
+		self.clientInfo['cursor'] = cursor
+		self.pending = []
+		if cursor is None:
+			return 'npt=now-'
+		return 'npt=%.3f-' % (cursor / channel.frameRate)
+
+	def startRtp(self):
+		"""Create the RTP socket and hand the session to the frame scheduler."""
+		if self.clientInfo.get('multicast'):
+			# Kênh đã gửi tới nhóm multicast: không cần socket riêng cho session
+			self.clientInfo['channel'].joinMulticast(self)
+			return
+		# Create a new socket for RTP/UDP
+		self.clientInfo["rtpSocket"] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		address = self.clientInfo['rtspSocket'][1][0]
+		port = self.clientInfo['rtpPort']
+		self.clientInfo['sender'] = RtpSender(self.clientInfo['rtpSocket'], (address, port))
+		# RTCP trên cổng kế tiếp: gửi SR, nhận RR không chặn mỗi lần gửi báo cáo
+		rtcpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		rtcpSocket.connect((address, port + 1))
+		rtcpSocket.setblocking(False)
+		self.clientInfo['rtcpSocket'] = rtcpSocket
 		
+		channel = self.clientInfo.get('channel')
+		if channel is not None and self.clientInfo.get('cursor') is None:
+			# Kênh phát chung gửi từ khung hình kế tiếp
+			channel.subscribe(self)
+		else:
+			# Phát lại từ cửa sổ time-shift của kênh cũng do bộ lập lịch điều nhịp
+			# Bộ lập lịch chung của server gửi gói RTP cho mọi session đang PLAY
+			frameScheduler.add(self)
+
+	def stopRtp(self):
+		"""Stop the RTP sender (PAUSE or TEARDOWN)."""
+		frameScheduler.remove(self)
+		channel = self.clientInfo.get('channel')
+		if channel is not None:
+			channel.unsubscribe(self)
+			channel.leaveMulticast(self)
+
+	def closeSession(self):
+		"""Close the RTP socket and release the media asset."""
+		self.stopRtp()
+		rtpSocket = self.clientInfo.pop('rtpSocket', None)
+		if rtpSocket is not None:
+			rtpSocket.close()
+		rtcpSocket = self.clientInfo.pop('rtcpSocket', None)
+		if rtcpSocket is not None:
+			rtcpSocket.close()
+		if 'stats' in self.clientInfo:
+			if self.verbose:
+				print("RTCP stats:", self.stats())
+			# closeSession chạy cả khi TEARDOWN lẫn khi kết nối đóng: chỉ in một lần
+			del self.clientInfo['stats']
+		activeSessions.discard(self)
+		videoStream = self.clientInfo.pop('videoStream', None)
+		if videoStream is not None:
+			videoStream.close()
+		channel = self.clientInfo.pop('channel', None)
+		if channel is not None:
+			channelHub.release(channel)
+
+	# Được gọi bởi FrameScheduler khi session đang PLAY
+	def tick(self, deadline):
+		"""Send the next burst of packets. Return the next deadline, or None to stop."""
+		source = self.clientInfo.get('videoStream') or self.clientInfo.get('channel')
+		sender = self.clientInfo.get('sender')
+		if source is None or sender is None:
+			return None
+		interval = 1.0 / source.frameRate
+
+		if not self.pending:
+			packets = self.nextPackets()
+			if packets is None:
+				if 'channel' not in self.clientInfo:
+					print("End of video.") # Dừng phát khi hết video
+				return None
+			# Chia các gói của khung hình thành vài đợt trải đều trong khoảng thời gian của khung hình
+			self.pending = packets
+			self.frameDeadline = deadline
+			bursts = -(-len(packets) // self.PACING_BURST)
+			self.burstInterval = interval / max(bursts, 1)
+
+		burst = self.pending[:self.PACING_BURST]
+		del self.pending[:self.PACING_BURST]
+		self.send(sender, burst)
+
+		if self.pending:
+			return deadline + self.burstInterval
+		# Mốc của khung hình sau tính từ mốc khung hình này, không tích luỹ độ trễ
+		return self.frameDeadline + interval
+
+	def nextPackets(self):
+		"""Packetize the next frame as (header, payload) pairs. Return None at the end."""
+		channel = self.clientInfo.get('channel')
+		if channel is not None:
+			return self.replayPackets(channel)
+		stream = self.clientInfo.get('videoStream')
+		if stream is None:
+			return None
+
+		# Lấy các fragment của khung hình từ cache dùng chung của asset
+		started = metrics.start()
+		fragments = stream.nextFragments()
+		metrics.stop('server.read', started)
+		if not fragments:
+			return None
+
+		# Lấy số thứ tự khung hình (sẽ là Timestamp)
+		timestamp = stream.frameNbr()
+		return self.packetize(fragments, timestamp)
+
+	def replayPackets(self, channel):
+		"""Packetize the next frame of the channel's time-shift window. Return None once live."""
+		frame = channel.replay(self, self.clientInfo['cursor'])
+		if frame is None:
+			# Đã đăng ký nhận trực tiếp từ kênh
+			self.clientInfo['cursor'] = None
+			return None
+		timestamp, fragments = frame
+		self.clientInfo['cursor'] = timestamp + 1
+		self.clientInfo['position'] = timestamp
+		return self.packetize(fragments, timestamp)
+
+	def packetize(self, fragments, timestamp):
+		"""Fill this session's seqnum, timestamp and SSRC into shared fragments."""
+		started = metrics.start()
+		ssrc = self.clientInfo['ssrc']
+		# Chỉ cần điền seqnum, timestamp và SSRC của session vào header mẫu
+		packets = []
+		for template, payload in fragments:
+			# Tăng Sequence Number cho MỖI GÓI TIN RTP
+			self.seqnum += 1 
+			packets.append((patchHeader(template, self.seqnum, timestamp, ssrc), payload))
+		if self.fecGroup and packets:
+			packets, self.fecSeq = addParity(packets, fragments, timestamp, ssrc,
+				self.seqnum - len(packets) + 1, self.fecSeq, self.fecGroup)
+		if started:
+			metrics.stop('server.packetize', started)
+			metrics.count('server.frames')
+		return packets
+
+	# Được gọi bởi BroadcastChannel cho mỗi khung hình của kênh
+	def sendFragments(self, fragments, timestamp):
+		"""Send one frame of a broadcast channel to this session."""
+		self.clientInfo['position'] = timestamp
+		self.deliver(self.packetize(fragments, timestamp))
+
+	def deliver(self, packets):
+		sender = self.clientInfo.get('sender')
+		if sender is None:
+			return
+		self.send(sender, packets)
+
+	def send(self, sender, packets):
+		"""Send packets through the session's sender and count them."""
+		started = metrics.start()
+		try:
+			sender.sendFrame(packets)
+		except Exception as e:
+			metrics.count('server.errors')
+			if self.verbose:
+				print("Connection Error")
+		if started:
+			metrics.stop('server.send', started)
+			metrics.count('server.packets', len(packets))
+			metrics.count('server.bytes', sum(len(header) + len(payload) for header, payload in packets))
+		self.countSent(packets)
+
+	def countSent(self, packets):
+		"""Update the RTCP sender counters and send an SR when one is due."""
+		stats = self.clientInfo.get('stats')
+		if stats is None:
+			return
+		stats.onSent(packets)
+		now = monotonic()
+		if now >= self.nextReport:
+			self.nextReport = now + RTCP_INTERVAL
+			self.sendRtcp(stats.senderReport())
+		elif any(header[1] & 0x80 for header, _ in packets):
+			# Hết một khung hình: đọc RR đã đến để RTT không bị cộng thêm thời gian chờ
+			self.recvRtcp()
+		self.adaptRendition(stats)
+
+	def adaptRendition(self, stats):
+		"""Let the rate controller pick the rendition for the next frame."""
+		controller = self.clientInfo.get('abr')
+		stream = self.clientInfo.get('videoStream')
+		if controller is None or stream is None:
+			return
+		level = controller.update(stats)
+		if level != stream.level:
+			if self.verbose:
+				print("Session %s: rendition %d -> %d" % (self.clientInfo['session'], stream.level, level))
+			stream.level = level
+
+	def sendRtcp(self, data):
+		"""Send an SR, then read the receiver reports that arrived since the last one."""
+		rtcpSocket = self.clientInfo.get('rtcpSocket')
+		if rtcpSocket is None:
+			return
+		try:
+			rtcpSocket.send(data)
+		except OSError:
+			pass
+		self.recvRtcp()
+
+	def recvRtcp(self):
+		"""Read pending receiver reports without blocking."""
+		rtcpSocket = self.clientInfo.get('rtcpSocket')
+		# closeSession (luồng RTSP) có thể vừa xoá bộ đếm trong lúc luồng gửi đang chạy
+		stats = self.clientInfo.get('stats')
+		if rtcpSocket is None or stats is None:
+			return
 		while True:
-			self.clientInfo['event'].wait(0.05) 
-			
-			# Stop sending if request is PAUSE or TEARDOWN
-			if self.clientInfo['event'].isSet(): 
-				break 
-				
-			# Lấy toàn bộ khung hình (ví dụ: 50 KB)	
-			data = self.clientInfo['videoStream'].nextFrame()
-			# Nếu còn dữ liệu khung hình
-			if data: 
-				# Lấy số thứ tự khung hình (sẽ là Timestamp)
-				frameNumber = self.clientInfo['videoStream'].frameNbr()
-				timestamp = frameNumber
-
-				current_index = 0
-				total_length = len(data)
-
-				address = self.clientInfo['rtspSocket'][1][0]
-				port = int(self.clientInfo['rtpPort'])
-
-				while current_index < total_length:
-            		# 1. Xác định kích thước Payload cho gói tin hiện tại
-					payload_length = min(MAX_RTP_PAYLOAD, total_length - current_index)
-					payload = data[current_index:current_index + payload_length]
-            
-            		# 2. Xác định cờ Marker: Chỉ gói cuối cùng mới có M=1
-					marker_bit = 0
-					if current_index + payload_length >= total_length:
-                		# Đây là gói tin cuối cùng của khung hình
-						marker_bit = 1
-                
-            		# 3. Tăng Sequence Number cho MỖI GÓI TIN RTP
-					self.seqnum += 1 
-            
-            		# 4. Tạo và đóng gói gói tin RTP
-					packet = self.makeRtp(payload, self.seqnum, marker_bit, timestamp)
-            
-           			# 5. Gửi gói tin
-					try:
-						self.clientInfo['rtpSocket'].sendto(packet, (address, port))
-					except Exception as e:
-						# ... (xử lý lỗi gửi) ...
-						print("Connection Error")
-						break
-                
-            		# Cập nhật chỉ mục cho lần lặp tiếp theo
-					current_index += payload_length
-			else:
-				print("End of video.") # Dừng phát khi hết video
+			try:
+				report = rtcpSocket.recv(2048)
+			except OSError:
 				break
+			stats.onRtcp(report)
+
+	def stats(self):
+		"""Return this session's counters as a dict."""
+		stats = self.clientInfo.get('stats')
+		result = {'session': self.clientInfo.get('session'), 'state': self.state}
+		if 'rtspSocket' in self.clientInfo:
+			result['client'] = '%s:%s' % tuple(self.clientInfo['rtspSocket'][1][:2])
+		if stats is not None:
+			result.update(stats.stats())
+		controller = self.clientInfo.get('abr')
+		if controller is not None:
+			result['rendition'] = controller.level
+			result['renditionSwitches'] = controller.switches
+		channel = self.clientInfo.get('channel')
+		if channel is not None and self.clientInfo.get('multicast') and channel.multicast is not None:
+			result['multicastSendErrors'] = channel.multicast.sendErrors
+		cursor = self.clientInfo.get('cursor')
+		if channel is not None and cursor is not None:
+			# Số frame đang chậm sau trực tiếp khi phát lại từ cửa sổ time-shift
+			result['behindLive'] = channel.timestamp - cursor + 1
+		return result
 			
 	def makeRtp(self, payload, seqnum, marker, timestamp):
 		"""Hàm hỗ trợ đóng gói RTP với các tham số cần thiết cho Phân gói."""
@@ -184,16 +532,31 @@ class ServerWorker:
 		
 		return rtpPacket.getPacket()
 
-	def replyRtsp(self, code, seq):
+	def replyRtsp(self, code, seq, headers=None):
 		"""Send RTSP reply to the client."""
 		if code == self.OK_200:
 			#print("200 OK")
 			reply = 'RTSP/1.0 200 OK\nCSeq: ' + seq + '\nSession: ' + str(self.clientInfo['session'])
-			connSocket = self.clientInfo['rtspSocket'][0]
-			connSocket.send(reply.encode())
+			# Header bổ sung nằm sau Session để client cũ vẫn đọc đúng 3 dòng đầu
+			for name, value in (headers or {}).items():
+				reply += '\n' + name + ': ' + value
+			# Dòng trống kết thúc reply
+			reply += '\n\n'
+			self.sendRtsp(reply.encode())
 		
 		# Error messages
-		elif code == self.FILE_NOT_FOUND_404:
-			print("404 NOT FOUND")
-		elif code == self.CON_ERR_500:
-			print("500 CONNECTION ERROR")
+		elif code in self.ERRORS:
+			status = self.ERRORS[code]
+			if self.verbose:
+				print(status)
+			# Không có dòng Session: lỗi trả về trước khi session được tạo
+			self.sendRtsp(('RTSP/1.0 ' + status + '\nCSeq: ' + seq + '\n\n').encode())
+
+	def localAddress(self):
+		"""Server-side IP address of the RTSP connection (used as the multicast interface)."""
+		return self.clientInfo['rtspSocket'][0].getsockname()[0]
+
+	def sendRtsp(self, data):
+		"""Write raw bytes on the RTSP connection."""
+		connSocket = self.clientInfo['rtspSocket'][0]
+		connSocket.send(data)
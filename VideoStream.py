@@ -1,143 +1,348 @@
 from email import header
+from array import array
 import re
 import struct
 import os
+import sys
+import threading
 
+# Sidecar index file: <video>.idx, lưu (offset, length) của từng khung hình
+INDEX_EXT = '.idx'
+INDEX_MAGIC = b'VSIX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHH QQ Q')
+INDEX_FORMATS = ("RAW", "CUSTOM", "HEADERED", "PACKED")
 
-class VideoStream:
-	def __init__(self, filename):
-		self.filename = filename
+# Container đóng gói sẵn bởi Packager.py: header, bảng offset/độ dài/timestamp của từng
+# khung hình, (tuỳ chọn) ranh giới fragment RTP, rồi dữ liệu. Đọc không cần quét file.
+CONTAINER_MAGIC = b'VSPK'
+CONTAINER_VERSION = 1
+# magic, version, flags, tốc độ khung hình (x1000), kích thước payload của bảng fragment,
+# số khung hình, tổng số fragment
+CONTAINER_HEADER = struct.Struct('<4sHH II QQ')
+FLAG_FRAGMENTS = 1
+
+# Kích thước mỗi lần đọc khi quét file RAW để tìm EOI
+SCAN_CHUNK = 1 << 20
+
+EOI = b'\xFF\xD9'
+
+# MJPEG không lưu tốc độ khung hình: mặc định 20 fps
+DEFAULT_FRAME_RATE = 20
+
+
+class FrameIndex:
+	"""Offset/length table for every frame of a video file."""
+
+	def __init__(self, format, offsets, lengths, frameRate=DEFAULT_FRAME_RATE, timestamps=None,
+			payloadSize=0, fragmentStarts=None, fragmentEnds=None):
+		self.format = format
+		self.offsets = offsets
+		self.lengths = lengths
+		self.frameRate = frameRate
+		self.timestamps = timestamps # mili giây, chỉ có trong container
+		self.payloadSize = payloadSize
+		self.fragmentStarts = fragmentStarts
+		self.fragmentEnds = fragmentEnds
+
+	def __len__(self):
+		return len(self.offsets)
+
+	def frame(self, frameIndex):
+		"""Return (offset, length) of a frame (0-based)."""
+		return self.offsets[frameIndex], self.lengths[frameIndex]
+
+	def timestamp(self, frameIndex):
+		"""Presentation time of a frame in milliseconds."""
+		if self.timestamps is not None:
+			return self.timestamps[frameIndex]
+		return int(frameIndex * 1000 / self.frameRate)
+
+	def fragments(self, frameIndex, payloadSize):
+		"""Precomputed fragment end offsets (within the frame) for this payload size, or None."""
+		if self.fragmentStarts is None or payloadSize != self.payloadSize:
+			return None
+		return self.fragmentEnds[self.fragmentStarts[frameIndex]:self.fragmentStarts[frameIndex + 1]]
+
+	def save(self, indexFile, filesize, mtime):
+		"""Write the index to a sidecar file."""
+		offsets = array('Q', self.offsets)
+		lengths = array('Q', self.lengths)
+		if sys.byteorder == 'big':
+			offsets.byteswap()
+			lengths.byteswap()
+		head = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, INDEX_FORMATS.index(self.format),
+			filesize, mtime, len(offsets))
+		tmpFile = indexFile + '.tmp'
+		with open(tmpFile, 'wb') as f:
+			f.write(head)
+			f.write(offsets.tobytes())
+			f.write(lengths.tobytes())
+		os.replace(tmpFile, indexFile)
+
+	@classmethod
+	def load(cls, indexFile, filesize, mtime):
+		"""Read a sidecar index. Return None if it is missing or stale."""
 		try:
-			# Mở file ở chế độ nhị phân (rb)
-			self.file = open(filename, 'rb')
-		except:
-			raise IOError
-		self.frameNum = 0
-		# Byte đánh dấu cuối khung hình JPEG (End of Image - EOI)
-		self.EOI = b'\xFF\xD9'
-		self.format = self.detectFormat() # Xác định định dạng file
-		print(f"VideoStream: Detected format = {self.format}")
+			with open(indexFile, 'rb') as f:
+				head = f.read(INDEX_HEADER.size)
+				magic, version, fmt, size, stamp, count = INDEX_HEADER.unpack(head)
+				if magic != INDEX_MAGIC or version != INDEX_VERSION:
+					return None
+				if size != filesize or stamp != mtime or fmt >= len(INDEX_FORMATS):
+					return None
+				offsets = array('Q')
+				lengths = array('Q')
+				offsets.frombytes(f.read(count * 8))
+				lengths.frombytes(f.read(count * 8))
+		except (OSError, struct.error, ValueError):
+			return None
+		if len(offsets) != count or len(lengths) != count:
+			return None
+		if sys.byteorder == 'big':
+			offsets.byteswap()
+			lengths.byteswap()
+		return cls(INDEX_FORMATS[fmt], offsets, lengths)
 
-	def detectFormat(self):
-		self.file.seek(0)
-		header = self.file.read(16)
-		filesize = os.path.getsize(self.filename)
-		self.file.seek(0)
-
-		# 1. KIỂM TRA CUSTOM (ASCII digits đầu file)
-		if re.match(rb'\d{1,8}', header[:8]):
-			print("[Detect] CUSTOM length-prefixed (ASCII digits).")
+
+def readArray(file, typecode, count):
+	values = array(typecode)
+	values.frombytes(file.read(count * values.itemsize))
+	if len(values) != count:
+		raise ValueError('truncated container table')
+	if sys.byteorder == 'big':
+		values.byteswap()
+	return values
+
+
+def readContainer(file):
+	"""Read the FrameIndex stored in a packed container. Return None if the file is not one."""
+	file.seek(0)
+	head = file.read(CONTAINER_HEADER.size)
+	if len(head) < CONTAINER_HEADER.size or head[:4] != CONTAINER_MAGIC:
+		return None
+	magic, version, flags, rate, payloadSize, count, fragmentCount = CONTAINER_HEADER.unpack(head)
+	if version != CONTAINER_VERSION:
+		raise ValueError('unsupported container version %d' % version)
+	offsets = readArray(file, 'Q', count)
+	lengths = readArray(file, 'Q', count)
+	timestamps = readArray(file, 'Q', count)
+	fragmentStarts = fragmentEnds = None
+	if flags & FLAG_FRAGMENTS:
+		fragmentStarts = readArray(file, 'Q', count + 1)
+		fragmentEnds = readArray(file, 'I', fragmentCount)
+	return FrameIndex("PACKED", offsets, lengths, rate / 1000, timestamps,
+		payloadSize, fragmentStarts, fragmentEnds)
+
+
+# Cache trong tiến trình: dùng lại index giữa các session
+_indexCache = {}
+_indexLock = threading.Lock()
+
+
+def loadFrameIndex(filename):
+	"""Return the FrameIndex of a file, from memory, the sidecar, or a fresh scan."""
+	path = os.path.abspath(filename)
+	st = os.stat(path)
+	key = (st.st_size, st.st_mtime_ns)
+	with _indexLock:
+		cached = _indexCache.get(path)
+		if cached is not None and cached[0] == key:
+			return cached[1]
+
+		with open(path, 'rb') as f:
+			# Container đã có sẵn bảng khung hình: không cần sidecar hay quét
+			index = readContainer(f)
+		if index is not None:
+			_indexCache[path] = (key, index)
+			return index
+
+		indexFile = path + INDEX_EXT
+		index = FrameIndex.load(indexFile, st.st_size, st.st_mtime_ns)
+		if index is None:
+			with open(path, 'rb') as f:
+				index = buildFrameIndex(f, st.st_size)
+			try:
+				index.save(indexFile, st.st_size, st.st_mtime_ns)
+			except OSError:
+				# Thư mục chỉ đọc: vẫn dùng index trong bộ nhớ
+				pass
+		_indexCache[path] = (key, index)
+		return index
+
+
+def detectFormat(file, filesize):
+	"""Guess the container format of an opened video file."""
+	file.seek(0)
+	header = file.read(16)
+	file.seek(0)
+
+	if header[:4] == CONTAINER_MAGIC:
+		return "PACKED"
+
+	# 1. KIỂM TRA CUSTOM (ASCII digits đầu file)
+	if re.match(rb'\d{1,8}', header[:8]):
+		print("[Detect] CUSTOM length-prefixed (ASCII digits).")
+		return "CUSTOM"
+
+	# 2. KIỂM TRA CUSTOM (Binary 8-byte big-endian)
+	try:
+		val = struct.unpack("!Q", header[:8])[0]
+		if 0 < val < filesize:
+			print("[Detect] CUSTOM length-prefixed (Binary 8-byte).")
 			return "CUSTOM"
+	except:
+		pass
+	# 3. KIỂM TRA HEADERED (frameSize + frameNum)
+	try:
+		frameSize, frameNum = struct.unpack("!II", header[:8])
+		file.seek(8)
+		soi = file.read(2)
+		file.seek(0)
 
-		# 2. KIỂM TRA CUSTOM (Binary 8-byte big-endian)
-		try:
-			val = struct.unpack("!Q", header[:8])[0]
-			if 0 < val < filesize:
-				print("[Detect] CUSTOM length-prefixed (Binary 8-byte).")
-				return "CUSTOM"
-		except:
-			pass
-		# 3. KIỂM TRA HEADERED (frameSize + frameNum)
-		try:
-			frameSize, frameNum = struct.unpack("!II", header[:8])
-			self.file.seek(8)
-			soi = self.file.read(2)
-			self.file.seek(0)
-
-			if 0 < frameSize < filesize and soi == b'\xFF\xD8':
-				print("[Detect] HEADERED format.")
-				return "HEADERED"
-		except:
-			pass
+		if 0 < frameSize < filesize and soi == b'\xFF\xD8':
+			print("[Detect] HEADERED format.")
+			return "HEADERED"
+	except:
+		pass
 
-		# 4. MẶC ĐỊNH RAW
-		print("[Detect] RAW MJPEG (split-by-EOI).")
-		return "RAW"
+	# 4. MẶC ĐỊNH RAW
+	print("[Detect] RAW MJPEG (split-by-EOI).")
+	return "RAW"
 
-	def nextFrame(self):
-		"""Get next frame depending on detected format."""
-		if self.format == "CUSTOM":
-			return self.readCustomFrame()
-		elif self.format == "HEADERED":
-			return self.readHeaderedFrame()
-		else:
-			return self.readRawFrame()	
-		
-	# CÁCH 1 – FILE CUSTOM (ASCII digits + frame data)
-	def readCustomFrame(self):
-		header = self.file.read(8)
+
+def buildFrameIndex(file, filesize):
+	"""Scan a video file once and return its FrameIndex."""
+	format = detectFormat(file, filesize)
+	offsets = array('Q')
+	lengths = array('Q')
+	if format == "CUSTOM":
+		scanCustomFrames(file, filesize, offsets, lengths)
+	elif format == "HEADERED":
+		scanHeaderedFrames(file, filesize, offsets, lengths)
+	else:
+		scanRawFrames(file, filesize, offsets, lengths)
+	file.seek(0)
+	return FrameIndex(format, offsets, lengths)
+
+
+# CÁCH 1 – FILE CUSTOM (ASCII digits hoặc 8-byte binary + frame data)
+def scanCustomFrames(file, filesize, offsets, lengths):
+	pos = 0
+	while pos < filesize:
+		file.seek(pos)
+		header = file.read(8)
 		if not header:
-			return None
+			break
 
 		# Try ASCII digits
 		m = re.match(rb'(\d+)', header)
 		if m:
 			framelength = int(m.group(1))
-
-			extra = header[m.end():]
-			remaining = framelength - len(extra)
-			data = extra + self.file.read(remaining)
-			self.frameNum += 1
-			return data
-
-		# Try binary
-		try:
+			start = pos + m.end()
+		elif len(header) == 8:
+			# Try binary
 			framelength = struct.unpack("!Q", header)[0]
-		except:
+			start = pos + 8
+		else:
 			print("[ERROR] Invalid custom header:", header)
-			return None
+			break
 
-		data = self.file.read(framelength)
-		self.frameNum += 1
-		return data
-	
-	# CÁCH 2 – FILE DEMO CÓ HEADER 8 BYTE
-	def readHeaderedFrame(self):
-		header = self.file.read(8)
-		if len(header) < 8:
-			return None
+		length = min(framelength, filesize - start)
+		offsets.append(start)
+		lengths.append(length)
+		pos = start + framelength
 
-		frameSize, frameNum = struct.unpack("!II", header)
-		frameData = self.file.read(frameSize)
 
-		if len(frameData) < frameSize:
-			return None
-		self.frameNum += 1
-		return frameData
+# CÁCH 2 – FILE DEMO CÓ HEADER 8 BYTE
+def scanHeaderedFrames(file, filesize, offsets, lengths):
+	pos = 0
+	while pos + 8 <= filesize:
+		file.seek(pos)
+		frameSize, frameNum = struct.unpack("!II", file.read(8))
+		if pos + 8 + frameSize > filesize:
+			break
+		offsets.append(pos + 8)
+		lengths.append(frameSize)
+		pos += 8 + frameSize
 
-	# CÁCH 3 – RAW MJPEG (KHÔNG HEADER)
-	def readRawFrame(self):
-		"""Get next frame by searching for the JPEG End of Image (EOI) marker."""
-		# Đọc dữ liệu từ vị trí hiện tại
-		data = self.file.read(os.path.getsize(self.filename) - self.file.tell())
 
-		if not data:
-			return None # Hết tệp
+# CÁCH 3 – RAW MJPEG (KHÔNG HEADER)
+def scanRawFrames(file, filesize, offsets, lengths):
+	"""Split the file on the JPEG End of Image (EOI) marker, reading fixed-size chunks."""
+	file.seek(0)
+	start = 0 # Vị trí bắt đầu của khung hình hiện tại
+	base = 0 # Vị trí tuyệt đối của chunk đang đọc
+	tail = b''
+	while True:
+		chunk = file.read(SCAN_CHUNK)
+		if not chunk:
+			break
+		# Giữ lại byte cuối của chunk trước để không bỏ sót 0xFF D9 nằm giữa hai chunk
+		data = tail + chunk
+		dataStart = base - len(tail)
+		i = 0
+		while True:
+			eoi_pos = data.find(EOI, i)
+			if eoi_pos == -1:
+				break
+			# Khung hình hoàn chỉnh bao gồm cả 0xFF D9
+			frame_end = dataStart + eoi_pos + 2
+			offsets.append(start)
+			lengths.append(frame_end - start)
+			start = frame_end
+			i = eoi_pos + 2
+		base += len(chunk)
+		tail = data[-1:] if len(data) > i else b''
 
-		# Tìm vị trí của điểm kết thúc khung hình JPEG (0xFF D9)
-		# Bắt đầu tìm kiếm ngay từ đầu dữ liệu đã đọc
-		eoi_pos = data.find(self.EOI)
+	if start < filesize:
+		print("Warning: EOI marker not found in the last chunk of data.")
 
-		if eoi_pos == -1:
-			# Nếu không tìm thấy EOI, có thể là khung hình cuối cùng bị cắt
-			# Hoặc tệp bị lỗi. Trả về None nếu không có thêm dữ liệu.
-			if len(data) > 0:
-				print("Warning: EOI marker not found in the last chunk of data.")
-			return None
 
-		# Vị trí của byte D9 là eoi_pos + 1. 
-		# Khung hình hoàn chỉnh bao gồm cả 0xFF D9, nên lấy eoi_pos + 2
-		frame_end_index = eoi_pos + 2
-
-		# Dữ liệu khung hình là từ đầu cho đến EOI (bao gồm EOI)
-		frame_data = data[:frame_end_index]
+class VideoStream:
+	def __init__(self, filename):
+		self.filename = filename
+		try:
+			# Mở file ở chế độ nhị phân (rb)
+			self.file = open(filename, 'rb')
+			# Bảng offset của các khung hình (quét một lần, dùng lại giữa các session)
+			self.index = loadFrameIndex(filename)
+		except:
+			raise IOError
+		self.frameNum = 0
+		# Byte đánh dấu cuối khung hình JPEG (End of Image - EOI)
+		self.EOI = EOI
+		self.format = self.index.format # Xác định định dạng file
+		self.frameRate = self.index.frameRate
+		print(f"VideoStream: Detected format = {self.format}")
 
-		# Cập nhật con trỏ file: di chuyển đến ngay sau EOI để sẵn sàng đọc khung hình tiếp theo
-		self.file.seek(self.file.tell() - len(data) + frame_end_index)
+	def detectFormat(self):
+		return detectFormat(self.file, os.path.getsize(self.filename))
 
+	def nextFrame(self):
+		"""Get next frame using the frame index: one exact-size read."""
+		if self.frameNum >= len(self.index):
+			return None # Hết tệp
+		offset, length = self.index.frame(self.frameNum)
+		self.file.seek(offset)
+		data = self.file.read(length)
+		if len(data) < length:
+			return None
 		self.frameNum += 1
-		return frame_data
+		return data
+
+	def seek(self, frameNumber):
+		"""Jump so that the next frame read is frameNumber (0-based). O(1) with the frame index."""
+		self.frameNum = max(0, min(frameNumber, len(self.index)))
+
+	def frameCount(self):
+		"""Get the total number of frames."""
+		return len(self.index)
 
 	def frameNbr(self):
 		"""Get frame number."""
-		return self.frameNum
\ No newline at end of file
+		return self.frameNum
+
+	def close(self):
+		"""Close the video file."""
+		self.file.close()